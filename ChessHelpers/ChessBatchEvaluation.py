@@ -0,0 +1,133 @@
+# Chess Batch Evaluation
+#
+# This file contains a vectorised version of heuristic #2 (see ChessHeuristics.py), which scores
+# many positions at once with numpy instead of one at a time with Python loops.
+#
+# The positions are given either as bitboards, an (N, 12) array of 64-bit integers (one bitboard per
+# piece type and color), or as planes, an (N, 12, 64) array of 0/1 (one plane per piece type and
+# color, one value per square). The material, center and diagonal terms of all N positions are
+# then a single matrix product of the (N, 768) planes with a (768, 4) table of weights.
+#
+# The mini max search in ChessEngineHelper.py uses it (BATCH_EVAL) to score all the children of a
+# frontier node (depth 1) in one pass.
+#
+# Requires numpy:
+# > pip install numpy
+
+import numpy as np
+import chess
+from ChessHelpers.ChessHeuristics import Heuristics, PIECE_TYPES, CENTER_PIECE_SCORE, \
+    BB_DIAGONAL_A1_H8, BB_DIAGONAL_A8_H1, BB_CONTROL_CENTER
+
+# plane order: white pawns, knights, bishops, rooks, queens, kings, then the same for black
+PLANES = [(color, piece_type) for color in (chess.WHITE, chess.BLACK) for piece_type in PIECE_TYPES]
+
+# columns of the terms matrix (the same terms as EvaluationAccumulator)
+MATERIAL = 0
+DIAGONALS_WHITE = 1
+DIAGONALS_BLACK = 2
+CENTER = 3
+
+# game state of a position
+NORMAL = 0
+CHECKMATE = 1  # the player to move is checkmated
+STALEMATE = 2
+
+
+def board_bitboards(board):
+    white = board.occupied_co[chess.WHITE]
+    black = board.occupied_co[chess.BLACK]
+    masks = (board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings)
+    return [mask & white for mask in masks] + [mask & black for mask in masks]
+
+
+def board_state(board):
+    # (one legal move is enough to know it isn't checkmate or stalemate)
+    if any(board.generate_legal_moves()):
+        return NORMAL
+    return CHECKMATE if board.is_check() else STALEMATE
+
+
+def to_bitboards(boards):
+    return np.array([board_bitboards(board) for board in boards], dtype="<u8").reshape(-1, 12)
+
+
+# (N, 12) bitboards -> (N, 12, 64) planes (bit i of a bitboard is square i)
+def to_planes(bitboards):
+    bitboards = np.ascontiguousarray(bitboards, dtype="<u8")
+    bits = np.unpackbits(bitboards.view(np.uint8), bitorder="little")
+    return bits.reshape(len(bitboards), 12, 64)
+
+
+def square_mask(bitboard):
+    return np.array([1 if bitboard & chess.BB_SQUARES[square] else 0 for square in range(64)], dtype=np.int32)
+
+
+class BatchEvaluator:
+    def __init__(self, heuristics=None):
+        self.heuristics = heuristics if heuristics is not None else Heuristics()
+
+        # weights[plane, square, term]: how much a piece on that square adds to each term
+        weights = np.zeros((12, 64, 4), dtype=np.int32)
+        diagonals = square_mask(BB_DIAGONAL_A1_H8 | BB_DIAGONAL_A8_H1)
+        center = square_mask(BB_CONTROL_CENTER)
+        for plane, (color, piece_type) in enumerate(PLANES):
+            value = self.heuristics.piece_score[chess.piece_symbol(piece_type)]
+            weights[plane, :, MATERIAL] = value if color == chess.WHITE else -value
+            if piece_type in (chess.BISHOP, chess.QUEEN):
+                weights[plane, :, DIAGONALS_WHITE if color == chess.WHITE else DIAGONALS_BLACK] = 3 * diagonals
+            weights[plane, :, CENTER] = CENTER_PIECE_SCORE[piece_type] * center
+        self.weights = weights.reshape(12 * 64, 4)
+
+    '''
+    The (N, 4) terms (material, diagonals_white, diagonals_black, center) of N positions,
+    given as (N, 12) bitboards or (N, 12, 64) planes
+    '''
+
+    def terms(self, positions):
+        positions = np.asarray(positions)
+        if positions.ndim == 2:
+            positions = to_planes(positions)
+        planes = positions.reshape(len(positions), 12 * 64).astype(np.int32)
+        return planes @ self.weights
+
+    '''
+    Heuristic #2 of N positions (exactly the same scores as Heuristics.heuristic_2)
+
+    states and turns (one per position) are only needed for checkmates and stalemates,
+    without them every position is scored as a normal position
+    '''
+
+    def heuristic_2(self, positions, white, states=None, turns=None):
+        terms = self.terms(positions)
+        material = terms[:, MATERIAL] if white else -terms[:, MATERIAL]
+        score = material.astype(np.float64)
+        if states is not None:
+            states = np.asarray(states)
+            turns = np.asarray(turns, dtype=bool)
+            checkmate = np.where(turns == white, -self.heuristics.CHECKMATE, self.heuristics.CHECKMATE)
+            score = np.where(states == CHECKMATE, checkmate, score)
+            score = np.where(states == STALEMATE, self.heuristics.STALEMATE, score).astype(np.float64)
+        score += terms[:, DIAGONALS_WHITE if white else DIAGONALS_BLACK] / 5
+        score += terms[:, CENTER] / 4
+        return score
+
+    # heuristic #2 of a list of boards
+    def evaluate(self, boards, white):
+        return self.heuristic_2(to_bitboards(boards), white,
+                                [board_state(board) for board in boards], [board.turn for board in boards])
+
+    '''
+    Expands a node: heuristic #2 of the position after each of the moves, in one vectorised pass
+    '''
+
+    def evaluate_children(self, board, moves, white):
+        bitboards = []
+        states = []
+        for move in moves:
+            board.push(move)
+            bitboards.append(board_bitboards(board))
+            states.append(board_state(board))
+            board.pop()
+        turns = [not board.turn] * len(moves)
+        return self.heuristic_2(np.array(bitboards, dtype="<u8").reshape(-1, 12), white, states, turns)
@@ -0,0 +1,263 @@
+# Chess Benchmark
+#
+# This file contains a benchmark suite for ChessEngineHelper.py and ChessHeuristics.py, to tell whether
+# a change made things faster or slower. On a fixed set of opening, middlegame and endgame positions,
+# it measures:
+#
+#   - moves per second of every MoveGenerator method
+#   - nodes per second and time to depth of the mini max search
+#   - evaluations per second of every heuristic and heuristic term
+#
+# The results are written as JSON, and can be compared against a saved baseline:
+# > python -m ChessHelpers.ChessBenchmark --output baseline.json
+# > python -m ChessHelpers.ChessBenchmark --baseline baseline.json
+#
+# (timings depend on the machine, only compare results from the same machine)
+
+import sys
+import json
+import time
+import platform
+import argparse
+import chess
+from ChessHelpers.ChessEngineHelper import MoveGenerator
+from ChessHelpers.ChessHeuristics import Heuristics, EvaluationAccumulator
+
+BENCHMARK_POSITIONS = {
+    "opening": [
+        chess.STARTING_FEN,
+        "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3",
+        "rnbqkb1r/pp2pppp/3p1n2/8/3NP3/8/PPP2PPP/RNBQKB1R w KQkq - 1 5",
+    ],
+    "middlegame": [
+        "r1bq1rk1/pp2bppp/2n1pn2/2pp4/3P4/2PBPN2/PP1N1PPP/R1BQ1RK1 w - - 0 8",
+        "r2q1rk1/pb1nbppp/1p2pn2/2pp4/3P4/1P1BPN2/PBPN1PPP/R2Q1RK1 w - - 2 10",
+        "r1bqk2r/pppp1ppp/2n2n2/2b1p3/2B1P3/2N2N2/PPPP1PPP/R1BQK2R w KQkq - 6 5",
+    ],
+    "endgame": [
+        "6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1",
+        "8/5k2/8/3K4/8/8/4P3/8 w - - 0 1",
+        "8/pp3k2/2p5/8/2P5/1P3K2/P7/8 w - - 0 1",
+    ],
+}
+
+# the move generators which only look one move ahead (or play randomly)
+ONE_PLY_GENERATORS = ["random_move", "greedy_best_next_move", "mobility_best_next_move",
+                      "mobility_advanced_best_next_move", "mini_max_easy"]
+
+# how much worse a metric has to be than the baseline to count as a regression
+REGRESSION_THRESHOLD = 0.10
+
+ROUNDS = 3
+
+
+def positions(categories=None):
+    categories = categories if categories is not None else list(BENCHMARK_POSITIONS)
+    return [(category, fen) for category in categories for fen in BENCHMARK_POSITIONS[category]]
+
+
+# calls function(item) for all items, over and over until min_time has passed: calls per second
+# (the best of ROUNDS rounds, to keep other programs running on the machine from skewing the results)
+def rate(function, items, min_time):
+    best = 0.0
+    for _ in range(ROUNDS):
+        calls = 0
+        start = time.perf_counter()
+        while True:
+            for item in items:
+                function(item)
+            calls += len(items)
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time / ROUNDS:
+                break
+        best = max(best, calls / elapsed)
+    return best
+
+
+# the fastest time of function() (called at least once, and again until min_time has passed)
+def best_time(function, min_time):
+    best = None
+    total = 0.0
+    while best is None or total < min_time:
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        total += elapsed
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+'''
+Moves per second of the one-ply move generators (a generator which raises an error is reported as such)
+'''
+
+
+def benchmark_generators(fens, min_time=0.5):
+    results = {}
+    for name in ONE_PLY_GENERATORS:
+        generator = MoveGenerator()
+        method = getattr(generator, name)
+        try:
+            results[name] = {"moves_per_second": rate(lambda fen: method(chess.Board(fen)), fens, min_time)}
+        except Exception as e:
+            results[name] = {"error": type(e).__name__ + ": " + str(e)}
+    return results
+
+
+'''
+Mini max search: time to reach every depth up to max_depth (summed over the positions, in total and
+for every category of positions), and the nodes per second at every depth.
+The search is run with the settings given, e.g. {"PVS": True}.
+'''
+
+
+def benchmark_search(selected, max_depth=4, min_time=0.5, settings=None):
+    categories = ["all"] + sorted({category for category, _ in selected}, key=list(BENCHMARK_POSITIONS).index)
+    results = {category: {"time_to_depth": {}, "nodes": {}, "nodes_per_second": {}} for category in categories}
+    results["settings"] = settings or {}
+    for depth in range(1, max_depth + 1):
+        times = dict.fromkeys(categories, 0.0)
+        nodes = dict.fromkeys(categories, 0)
+        for category, fen in selected:
+            generator = MoveGenerator()
+            for name, value in (settings or {}).items():
+                setattr(generator, name, value)
+            generator.DEPTH = depth
+            elapsed = best_time(lambda: generator.mini_max_move(chess.Board(fen)), min_time / len(selected))
+            for key in ("all", category):
+                times[key] += elapsed
+                nodes[key] += generator.nodes
+        for category in categories:
+            result = results[category]
+            result["time_to_depth"][str(depth)] = times[category]
+            result["nodes"][str(depth)] = nodes[category]
+            result["nodes_per_second"][str(depth)] = nodes[category] / times[category] if times[category] else 0.0
+    return results
+
+
+'''
+Evaluations per second of every heuristic and of every term of the heuristics
+'''
+
+
+def benchmark_heuristics(fens, min_time=0.5):
+    heuristics = Heuristics()
+    boards = [chess.Board(fen) for fen in fens]
+    # (heuristic #3 and mobility_advanced score the move which was just made)
+    after_move = []
+    for board in boards:
+        for move in list(board.legal_moves)[:5]:
+            child = board.copy()
+            child.push(move)
+            after_move.append((child, move))
+    accumulators = [(board, EvaluationAccumulator(heuristics, board)) for board in boards]
+
+    terms = {
+        "heuristic_1": (lambda b: heuristics.heuristic_1(b, True), boards),
+        "heuristic_2": (lambda b: heuristics.heuristic_2(b, True), boards),
+        "heuristic_3": (lambda bm: heuristics.heuristic_3(bm[0], True, bm[1]), after_move),
+        "score_material": (lambda b: heuristics.score_material(b, True), boards),
+        "control_diagonals": (lambda b: heuristics.control_diagonals(b, True), boards),
+        "control_center": (lambda b: heuristics.control_center(b, True), boards),
+        "mobility": (lambda b: heuristics.mobility(b), boards),
+        "mobility_advanced": (lambda bm: heuristics.mobility_advanced(bm[0], bm[1]), after_move),
+        "incremental_heuristic_2": (lambda ba: ba[1].heuristic_2(ba[0], True), accumulators),
+    }
+    results = {}
+    for name, (function, items) in terms.items():
+        try:
+            results[name] = {"evals_per_second": rate(function, items, min_time)}
+        except Exception as e:
+            results[name] = {"error": type(e).__name__ + ": " + str(e)}
+
+    # the batch evaluation, if numpy is installed (one call scores all the positions)
+    try:
+        from ChessHelpers.ChessBatchEvaluation import BatchEvaluator, to_bitboards
+    except ImportError:
+        pass
+    else:
+        evaluator = BatchEvaluator(heuristics)
+        bitboards = to_bitboards(boards)
+        results["batch_heuristic_2"] = {
+            "evals_per_second": len(boards) * rate(lambda b: evaluator.heuristic_2(b, True), [bitboards], min_time)}
+    return results
+
+
+def run_benchmark(categories=None, max_depth=4, min_time=0.5, settings=None):
+    selected = positions(categories)
+    fens = [fen for _, fen in selected]
+    results = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "positions": [{"category": category, "fen": fen} for category, fen in selected],
+        "generators": benchmark_generators(fens, min_time),
+        "search": benchmark_search(selected, max_depth, min_time, settings),
+        "heuristics": benchmark_heuristics(fens, min_time),
+    }
+    return results
+
+
+# all the timing metrics of a result as {"path/to/metric": value}
+def metrics(results, prefix=""):
+    found = {}
+    for name, value in results.items():
+        path = prefix + name
+        if isinstance(value, dict):
+            if name != "settings":
+                found.update(metrics(value, path + "/"))
+        elif isinstance(value, (int, float)) and ("per_second" in path or "time_to_depth" in path):
+            found[path] = value
+    return found
+
+
+'''
+Compares results against a baseline: returns the metrics which got worse by more than the threshold
+(rates which went down, or times which went up), as a list of (metric, baseline, current, change)
+'''
+
+
+def compare(baseline, results, threshold=REGRESSION_THRESHOLD):
+    regressions = []
+    current = metrics(results)
+    for path, old in metrics(baseline).items():
+        new = current.get(path)
+        if new is None or old == 0:
+            continue
+        change = (new - old) / old
+        worse = -change if "per_second" in path else change
+        if worse > threshold:
+            regressions.append((path, old, new, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the move generators and heuristics.")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare the results against this JSON file")
+    parser.add_argument("--depth", type=int, default=4, help="maximum search depth")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds per generator/heuristic")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument("--category", action="append", choices=list(BENCHMARK_POSITIONS))
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.category, args.depth, args.min_time)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(baseline, results, args.threshold)
+        for path, old, new, change in regressions:
+            print("REGRESSION %s: %.4g -> %.4g (%+.1f%%)" % (path, old, new, change * 100))
+        if regressions:
+            return 1
+        print("No regressions (threshold %.0f%%)" % (args.threshold * 100))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,278 @@
+# Chess Bitbases
+#
+# This file contains endgame bitbases for king + pawn/rook/queen against a lone king (KPK, KRK, KQK).
+# For every position of these endgames, a bitbase stores one bit: 1 if the side with the extra piece
+# wins with best play, 0 if it is a draw. With the bitbases loaded, the mini max search in
+# ChessEngineHelper.py knows the result of these positions instantly instead of searching them
+# (our heuristics don't know anything about endgames).
+#
+# The bitbases are generated offline with retrograde analysis (working backwards from the checkmates):
+# > python -m ChessHelpers.ChessBitbases bitbases/
+# and then loaded with mmap, so only the parts of the files which are actually probed are read.
+
+import os
+import sys
+import mmap
+import time
+import chess
+from ChessHelpers.ChessHeuristics import diagonal_attacks, straight_attacks
+
+# material signatures (the piece of the stronger side besides its king)
+SIGNATURES = {"KPK": chess.PAWN, "KRK": chess.ROOK, "KQK": chess.QUEEN}
+
+# position index: side to move (0 = stronger side, 1 = lone king), stronger king, lone king, piece
+# (if the stronger side is black, the board is flipped vertically so it is always "white")
+POSITIONS = 2 * 64 * 64 * 64
+
+# score of a won position (less than a checkmate, so the search still prefers an actual mate).
+# With the progress bonus of score() it stays between 200 and 290: well below CHECKMATE / 2, the
+# scores which the search (and the UCI engine's "score mate") take for a forced checkmate
+BITBASE_WIN = 200
+
+
+def position_index(stm, strong_king, weak_king, piece):
+    return ((stm * 64 + strong_king) * 64 + weak_king) * 64 + piece
+
+
+def piece_attacks(piece_type, square, occupied):
+    if piece_type == chess.PAWN:
+        return chess.BB_PAWN_ATTACKS[chess.WHITE][square]
+    if piece_type == chess.ROOK:
+        return straight_attacks(square, occupied)
+    return straight_attacks(square, occupied) | diagonal_attacks(square, occupied)
+
+
+# distance of a square from the four center squares (0 to 6)
+def center_distance(square):
+    file = chess.square_file(square)
+    rank = chess.square_rank(square)
+    return max(3 - file, file - 4) + max(3 - rank, rank - 4)
+
+
+'''
+Retrograde Analysis
+
+Marks all positions won for the stronger side, one ply further away from checkmate every pass:
+
+    stronger side to move: won if any move leads to a won position
+    lone king to move: won if it is checkmate, or if every move leads to a won position
+                       (taking the piece, and stalemate, are draws)
+
+until a pass doesn't find any new won positions. Promotions look up the KQK/KRK bitbases.
+'''
+
+
+def generate(piece_type, promotion_bitbases=None, verbose=False):
+    won = bytearray(POSITIONS)
+    strong_to_move = []
+    weak_to_move = []
+
+    # all legal positions (the kings can't touch, and the side which isn't to move can't be in check)
+    for strong_king in range(64):
+        for weak_king in range(64):
+            if weak_king == strong_king or chess.BB_KING_ATTACKS[strong_king] & chess.BB_SQUARES[weak_king]:
+                continue
+            for piece in range(64):
+                if piece in (strong_king, weak_king):
+                    continue
+                if piece_type == chess.PAWN and chess.square_rank(piece) in (0, 7):
+                    continue
+                occupied = chess.BB_SQUARES[strong_king] | chess.BB_SQUARES[weak_king] | chess.BB_SQUARES[piece]
+                if not piece_attacks(piece_type, piece, occupied) & chess.BB_SQUARES[weak_king]:
+                    strong_to_move.append((strong_king, weak_king, piece))
+                weak_to_move.append((strong_king, weak_king, piece))
+
+    passes = 0
+    changed = True
+    while changed:
+        changed = False
+        passes += 1
+
+        # lone king to move
+        undecided = []
+        for position in weak_to_move:
+            strong_king, weak_king, piece = position
+            occupied = chess.BB_SQUARES[strong_king] | chess.BB_SQUARES[piece]
+            attacked = chess.BB_KING_ATTACKS[strong_king] | piece_attacks(piece_type, piece, occupied)
+            moves = chess.BB_KING_ATTACKS[weak_king] & ~attacked
+            if not moves:
+                if attacked & chess.BB_SQUARES[weak_king]:
+                    won[position_index(1, strong_king, weak_king, piece)] = 1  # checkmate
+                    changed = True
+                continue  # (stalemate is a draw)
+            if moves & chess.BB_SQUARES[piece]:
+                continue  # the piece can be taken: draw
+            escaped = False
+            for square in chess.scan_forward(moves):
+                if not won[position_index(0, strong_king, square, piece)]:
+                    escaped = True
+                    break
+            if escaped:
+                undecided.append(position)
+            else:
+                won[position_index(1, strong_king, weak_king, piece)] = 1
+                changed = True
+        weak_to_move = undecided
+
+        # stronger side to move
+        undecided = []
+        for position in strong_to_move:
+            strong_king, weak_king, piece = position
+            if strong_wins(won, piece_type, strong_king, weak_king, piece, promotion_bitbases):
+                won[position_index(0, strong_king, weak_king, piece)] = 1
+                changed = True
+            else:
+                undecided.append(position)
+        strong_to_move = undecided
+
+        if verbose:
+            print("  pass", passes, "undecided:", len(strong_to_move), "+", len(weak_to_move))
+
+    return pack(won)
+
+
+def strong_wins(won, piece_type, strong_king, weak_king, piece, promotion_bitbases):
+    # king moves
+    king_moves = chess.BB_KING_ATTACKS[strong_king] & ~chess.BB_KING_ATTACKS[weak_king] & ~chess.BB_SQUARES[piece]
+    for square in chess.scan_forward(king_moves):
+        if won[position_index(1, square, weak_king, piece)]:
+            return True
+
+    occupied = chess.BB_SQUARES[strong_king] | chess.BB_SQUARES[weak_king]
+    if piece_type == chess.PAWN:
+        # pawn pushes (promote to a queen or rook)
+        square = piece + 8
+        if occupied & chess.BB_SQUARES[square]:
+            return False
+        if chess.square_rank(square) == 7:
+            for promotion in (chess.QUEEN, chess.ROOK):
+                bitbase = promotion_bitbases.get(promotion) if promotion_bitbases else None
+                if bitbase is not None and bitbase.won(position_index(1, strong_king, weak_king, square)):
+                    return True
+            return False
+        if won[position_index(1, strong_king, weak_king, square)]:
+            return True
+        if chess.square_rank(piece) == 1 and not occupied & chess.BB_SQUARES[square + 8]:
+            return bool(won[position_index(1, strong_king, weak_king, square + 8)])
+        return False
+
+    # rook/queen moves
+    piece_moves = piece_attacks(piece_type, piece, occupied) & ~occupied
+    for square in chess.scan_forward(piece_moves):
+        if won[position_index(1, strong_king, weak_king, square)]:
+            return True
+    return False
+
+
+# one bit per position
+def pack(won):
+    packed = bytearray(POSITIONS // 8)
+    for index in range(POSITIONS):
+        if won[index]:
+            packed[index >> 3] |= 1 << (index & 7)
+    return packed
+
+
+class Bitbase:
+    def __init__(self, data):
+        self.data = data
+
+    def won(self, index):
+        return (self.data[index >> 3] >> (index & 7)) & 1 == 1
+
+
+'''
+The loaded bitbases (every KPK.bin, KRK.bin and KQK.bin found in the directory)
+'''
+
+
+class Bitbases:
+    def __init__(self, directory):
+        self.bitbases = {}
+        self.files = []
+        self.probes = 0
+        for name, piece_type in SIGNATURES.items():
+            path = os.path.join(directory, name + ".bin")
+            if os.path.exists(path):
+                file = open(path, "rb")
+                self.files.append(file)
+                self.bitbases[piece_type] = Bitbase(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    '''
+    Returns (stronger color, True if won / False if drawn),
+    or None if the position is not covered by the bitbases
+    '''
+
+    def probe(self, board):
+        if chess.popcount(board.occupied) != 3:
+            return None
+        piece = chess.lsb(board.occupied & ~board.kings)
+        piece_type = board.piece_type_at(piece)
+        bitbase = self.bitbases.get(piece_type)
+        if bitbase is None:
+            return None
+        strong = board.color_at(piece)
+        strong_king = board.king(strong)
+        weak_king = board.king(not strong)
+        if strong == chess.BLACK:
+            strong_king, weak_king, piece = chess.square_mirror(strong_king), chess.square_mirror(weak_king), \
+                chess.square_mirror(piece)
+        stm = 0 if board.turn == strong else 1
+        self.probes += 1
+        return strong, bitbase.won(position_index(stm, strong_king, weak_king, piece))
+
+    '''
+    Score of the position from the point of view of the player to move (None if not covered).
+    Won positions get a bonus for making progress, since the bitbases only know won/drawn and not
+    how far away the checkmate is: push the lone king to the edge and bring the king closer,
+    or push the pawn.
+    '''
+
+    def score(self, board):
+        result = self.probe(board)
+        if result is None:
+            return None
+        strong, won = result
+        if not won:
+            return 0
+        if board.pawns:
+            progress = 10 * chess.square_rank(chess.square_mirror(chess.lsb(board.pawns))
+                                              if strong == chess.BLACK else chess.lsb(board.pawns))
+        else:
+            strong_king = board.king(strong)
+            weak_king = board.king(not strong)
+            progress = 10 * center_distance(weak_king) + 5 * (7 - chess.square_distance(strong_king, weak_king))
+        score = BITBASE_WIN + progress
+        return score if board.turn == strong else -score
+
+    def close(self):
+        for bitbase in self.bitbases.values():
+            bitbase.data.close()
+        for file in self.files:
+            file.close()
+        self.bitbases = {}
+        self.files = []
+
+
+'''
+Generates all the bitbases into a directory (KQK and KRK first, KPK needs them for promotions)
+'''
+
+
+def generate_all(directory, verbose=True):
+    os.makedirs(directory, exist_ok=True)
+    generated = {}
+    for name in ("KQK", "KRK", "KPK"):
+        start = time.perf_counter()
+        if verbose:
+            print("Generating", name)
+        data = generate(SIGNATURES[name], generated, verbose)
+        generated[SIGNATURES[name]] = Bitbase(data)
+        with open(os.path.join(directory, name + ".bin"), "wb") as file:
+            file.write(data)
+        if verbose:
+            print(name, "done in %.1fs" % (time.perf_counter() - start))
+
+
+if __name__ == '__main__':
+    generate_all(sys.argv[1] if len(sys.argv) > 1 else "bitbases")
@@ -3,11 +3,37 @@ Contains some utility methods that act as extensions to the chess library
 """
 
 import chess
+import math
 import random
-import pygame  # need to process pygame events to prevent game freeze
-from ChessHelpers.ChessHeuristics import Heuristics
+import sys
+import time
+from ChessHelpers.ChessBitbases import Bitbases
+from ChessHelpers.ChessEvaluationCache import EvaluationCache
+from ChessHelpers.ChessHeuristics import Heuristics, EvaluationAccumulator, NodeContext
+from ChessHelpers.ChessMoveOrdering import MoveOrderer
+from ChessHelpers.ChessSearchSession import SearchSession
+from ChessHelpers.ChessSearchStats import SearchStats
+from ChessHelpers.ChessTranspositionTable import TranspositionTable, EXACT, LOWER, UPPER
 # import timeit  # using to time some moves
 
+# the heuristic scores are multiples of 0.05, so a window this narrow can't contain any score
+# (a "null window" search only answers the question "is the score better than alpha?")
+NULL_WINDOW = 0.01
+
+
+'''
+Late move reduction table: how many plies to take off the search of the i-th move at a given depth.
+Later moves at higher depths get reduced more, base and divisor can be tuned.
+'''
+
+
+def reduction_table(base=0.75, divisor=2.25, size=64):
+    table = [[0] * size for _ in range(size)]
+    for depth in range(1, size):
+        for index in range(1, size):
+            table[depth][index] = int(base + math.log(depth) * math.log(index) / divisor)
+    return table
+
 
 class MoveGenerator:
     def __init__(self):
@@ -16,8 +42,104 @@ class MoveGenerator:
         # depth:
         #   in case it's counter-intuitive: these are individual moves, not pairs
         self.DEPTH = 4  # for now, 4-5 seems like a good trade-off between looking ahead and taking forever
-        self.QUIT = False
         self.heuristics = Heuristics()
+        # transposition table (re-use the results for positions reached by different move orders)
+        self.USE_TT = True
+        self.tt = TranspositionTable()
+        # only use entries searched to exactly the same depth for cutoffs (instead of the same depth or deeper),
+        # so the score doesn't depend on which other positions happened to be searched before
+        # (ParallelMoveGenerator needs this to find the same move as the serial search)
+        self.TT_EXACT_DEPTH = False
+        # iterative deepening:
+        #   with a time limit (seconds per move), search depth 1, 2, 3... until the time runs out
+        #   and play the best move of the last depth which was searched completely.
+        #   (None = always search to the fixed self.DEPTH)
+        self.TIME_LIMIT = None
+        self.MAX_DEPTH = 64
+        self.deadline = None
+        self.stopped = False
+        self.completed_depth = 0
+        # principal variation search:
+        #   search the first move with the full window and all the others with a null window,
+        #   only searching them again (with the full window) if they turn out to be better
+        self.PVS = False
+        # aspiration windows (with iterative deepening):
+        #   search each depth with a window around the previous depth's score first,
+        #   and only search again with the full window if the score falls outside of it
+        self.ASPIRATION_WINDOW = None
+        self.nodes = 0
+        # null move pruning:
+        #   let the opponent move twice: if our score is still too good (>= beta) with a search reduced
+        #   by NULL_MOVE_REDUCTION plies, a real move will be too. NULL_MOVE_VERIFY confirms the cutoff
+        #   with a reduced search of the actual moves. Not used when in check, or when we only have
+        #   pawns left (in those endgames, having to move can be a disadvantage: zugzwang)
+        self.NULL_MOVE = False
+        self.NULL_MOVE_REDUCTION = 2
+        self.NULL_MOVE_VERIFY = True
+        # late move reductions:
+        #   quiet moves which are ordered late are searched less deep (LMR_REDUCTIONS[depth][move index]),
+        #   and only searched again at the full depth if they turn out better than the best move so far
+        self.LMR = False
+        self.LMR_MIN_DEPTH = 3
+        self.LMR_MIN_MOVES = 3
+        self.LMR_REDUCTIONS = reduction_table()
+        # move ordering: killer moves and the history heuristic (learned from the cutoffs of this search)
+        self.KILLER_MOVES = True
+        self.HISTORY_HEURISTIC = True
+        self.orderer = MoveOrderer()
+        # an optional threading/multiprocessing Event which stops the search when it is set
+        # (the cancellation token of a search running in the background, e.g. in the GUI)
+        self.stop_event = None
+        # principal variation: the line of best moves found by the last (completed) search
+        self.pv = []
+        self.pv_table = []
+        # quiescence search:
+        #   at max depth, keep searching captures and promotions (and optionally checks) until the
+        #   position is quiet, so we don't stop scoring in the middle of an exchange.
+        #   QUIESCENCE_NODE_LIMIT caps the extra nodes per leaf, after that we score immediately.
+        self.QUIESCENCE = False
+        self.QUIESCENCE_CHECKS = False
+        self.QUIESCENCE_NODE_LIMIT = 500
+        self.quiescence_nodes = 0
+        self.quiescence_limit = 0
+        # incremental evaluation:
+        #   update the heuristic terms move by move during the search instead of scoring every leaf
+        #   from scratch (DEBUG_EVAL checks every leaf against the full evaluation, which is slow)
+        self.INCREMENTAL_EVAL = True
+        self.DEBUG_EVAL = False
+        # evaluation profiler:
+        #   PROFILE_EVAL starts a new profile of the heuristic terms for every search (self.heuristics.profile).
+        #   To profile a whole game instead, call self.heuristics.start_profile() once before it.
+        #   While profiling, leaves are scored by the full heuristics so that every term is timed
+        self.PROFILE_EVAL = False
+        # evaluation cache:
+        #   memory budget in bytes of an LRU cache of the heuristic scores (None = no cache).
+        #   It is kept between searches, and can be shared: other.heuristics.cache = self.heuristics.cache
+        self.EVAL_CACHE_BYTES = None
+        self.accumulator = None
+        # endgame bitbases (KPK, KRK, KQK):
+        #   the directory with the files generated by ChessBitbases.py (None = don't use them).
+        #   positions with exactly this material are scored won/drawn without searching them
+        self.BITBASE_PATH = None
+        self.bitbases = None
+        self.bitbase_root = False
+        # batch evaluation (requires numpy):
+        #   at depth 1, score all the children in one vectorised pass instead of searching them one by one
+        #   (see ChessBatchEvaluation.py, the scores and moves are the same)
+        self.BATCH_EVAL = False
+        self.batch_evaluator = None
+        # search statistics (see ChessSearchStats.py):
+        #   with STATS, or a progress callback(stats, iteration) in on_iteration, self.stats collects
+        #   the nodes per ply, leaf evaluations, cutoffs, iterations... of the last search (otherwise None)
+        self.STATS = False
+        self.on_iteration = None
+        # search session (see ChessSearchSession.py):
+        #   keep the transposition table, killer moves, history scores and principal variation between
+        #   the searches of the same game (aged) instead of starting every search cold.
+        #   Call new_game() when a new game starts
+        self.SESSION = False
+        self.session = None
+        self.stats = None
 
     '''
     Returns a random move from the list of all possible legal moves
@@ -35,18 +157,19 @@ class MoveGenerator:
     def greedy_best_next_move(self, board):
         white = board.turn == chess.WHITE
         legal_moves = list(board.legal_moves)
-        turn_multiplier = 1 if board.turn == chess.WHITE else -1
         max_score = -self.CHECKMATE
         best_move = None
 
         for player_move in legal_moves:
             board.push(player_move)  # make move
-            if board.is_checkmate():
+            context = NodeContext(board)
+            if context.is_checkmate():
                 score = self.CHECKMATE
-            elif board.is_stalemate():
+            elif context.is_stalemate():
                 score = self.STALEMATE
             else:
-                score = turn_multiplier * self.heuristics.heuristic_1(board, white)
+                # (heuristic_1 already scores the board from our point of view)
+                score = self.heuristics.heuristic_1(board, white, context=context)
             if score > max_score:
                 max_score = score
                 best_move = player_move
@@ -71,12 +194,13 @@ class MoveGenerator:
 
         for player_move in legal_moves:
             board.push(player_move)  # make move
-            if board.is_checkmate():
+            context = NodeContext(board)
+            if context.is_checkmate():
                 score = self.CHECKMATE
-            elif board.is_stalemate():
+            elif context.is_stalemate():
                 score = self.STALEMATE
             else:
-                score = turn_multiplier * self.heuristics.mobility(board)
+                score = turn_multiplier * self.heuristics.mobility(board, context)
             if score > max_score:
                 max_score = score
                 best_move = player_move
@@ -94,9 +218,10 @@ class MoveGenerator:
 
         for player_move in legal_moves:
             board.push(player_move)  # make move
-            if board.is_checkmate():
+            context = NodeContext(board)
+            if context.is_checkmate():
                 score = self.CHECKMATE
-            elif board.is_stalemate():
+            elif context.is_stalemate():
                 score = self.STALEMATE
             else:
                 score = self.heuristics.mobility_advanced(board, player_move)
@@ -122,22 +247,24 @@ class MoveGenerator:
         best_move = None
         for player_move in legal_moves:
             board.push(player_move)  # make move
-            opponent_moves = list(board.legal_moves)
+            context = NodeContext(board)
             opponent_max_score = self.CHECKMATE
-            if board.is_checkmate():
+            if context.is_checkmate():
                 opponent_max_score = -self.CHECKMATE
-            elif board.is_stalemate():
+            elif context.is_stalemate():
                 opponent_max_score = self.STALEMATE
             else:
                 opponent_max_score = -self.CHECKMATE
-                for opponent_move in opponent_moves:
+                for opponent_move in context.legal_moves():
                     board.push(opponent_move)  # make opponent's move
-                    if board.is_checkmate():
+                    opponent_context = NodeContext(board)
+                    if opponent_context.is_checkmate():
                         score = self.CHECKMATE
-                    elif board.is_stalemate():
+                    elif opponent_context.is_stalemate():
                         score = self.STALEMATE
                     else:
-                        score = -turn_multiplier * self.heuristics.heuristic_1(board)
+                        # (white's score, turned into the opponent's score)
+                        score = -turn_multiplier * self.heuristics.heuristic_1(board, True, context=opponent_context)
                     if score > opponent_max_score:
                         opponent_max_score = score
                     board.pop()  # undo the opponent's move
@@ -159,6 +286,8 @@ class MoveGenerator:
         # uncomment start/stop and import to time moves
         # start = timeit.default_timer()
 
+        # (TIME_LIMIT counts from here, so setting up the search in start_search is part of it)
+        search_start = time.perf_counter()
         best_move = [None]
         # changed 'white_to_move' to 'maximize'
         # it doesn't matter whose turn it is, as long as
@@ -178,99 +307,448 @@ class MoveGenerator:
         # alpha = "minimum score that the maximizing player is assured of"
         # beta = "maximum score that the minimizing player is assured of"
 
-        self.find_mini_max_move(board, self.DEPTH, maximize, white, -10000, 10000, best_move)
-        if self.QUIT is True:
-            return False
+        self.start_search(board)
 
+        if self.TIME_LIMIT is None:
+            score = self.find_mini_max_move(board, self.DEPTH, maximize, white, -10000, 10000, best_move)
+            self.pv = self.pv_table[0] if self.pv_table else []
+            self.completed_depth = self.DEPTH
+            if self.stats is not None:
+                self.stats.end_iteration(self.DEPTH, score, self.pv, self.nodes, self.quiescence_nodes,
+                                         not self.stopped)
+        else:
+            self.iterative_deepening(board, maximize, white, best_move, search_start)
         if best_move[0] is None:
-            print("Warning: no best move found.")
-            best_move[0] = self.random_move(board)
+            # (stopped before even the first root move was searched: play the move which would have been
+            #  searched first. The warning goes to stderr, stdout may be a protocol stream, see uci.py)
+            if not self.stopped:
+                print("Warning: no best move found.", file=sys.stderr)
+            legal_moves = self.order_moves(board, 0)
+            best_move[0] = legal_moves[0] if legal_moves else None
 
         # stop = timeit.default_timer()
         # print('Time: ', stop - start)
         return best_move[0]
 
-    def find_mini_max_move(self, board, depth, maximize, white, alpha, beta, best_move):
-        # keep processing events while the mini max search is going
-        # and allow the user to close the game if a move is in progress
-        try:
-            events = pygame.event.get()
-            for e in events:
-                if e.type == pygame.QUIT:
-                    self.QUIT = True
-            if self.QUIT is True:
-                return 0
-        except Exception:
-            # (if game is being run in terminal, there is no pygame)
-            pass
+    # reset everything a new search needs
+    def start_search(self, board, clear_tt=True):
+        if self.SESSION and self.session is None:
+            self.session = SearchSession()
+        plies = self.session.start_search(board) if self.SESSION else None
+        if plies is not None:
+            # a later position of the same game: keep what the last search learned
+            self.tt.new_search()
+            self.orderer.age(plies)
+            self.pv = self.session.remaining_pv(self.pv, plies)
+        else:
+            # start every search with an empty transposition table
+            if self.USE_TT and clear_tt:
+                self.tt.clear()
+            self.orderer.reset()
+            self.pv = []
+        self.deadline = None
+        self.stopped = False
+        self.nodes = 0
+        self.quiescence_nodes = 0
+        self.orderer.use_killers = self.KILLER_MOVES
+        self.orderer.use_history = self.HISTORY_HEURISTIC
+        if self.EVAL_CACHE_BYTES is not None and self.heuristics.cache is None:
+            self.heuristics.cache = EvaluationCache(self.EVAL_CACHE_BYTES)
+        if self.PROFILE_EVAL:
+            self.heuristics.start_profile()
+        if self.INCREMENTAL_EVAL and self.heuristics.profile is None:
+            self.accumulator = EvaluationAccumulator(self.heuristics, board)
+        else:
+            self.accumulator = None
+        self.stats = SearchStats(self.on_iteration) if self.STATS or self.on_iteration is not None else None
+        if self.BITBASE_PATH is not None and self.bitbases is None:
+            self.bitbases = Bitbases(self.BITBASE_PATH)
+        self.bitbase_root = self.bitbases is not None and self.bitbases.probe(board) is not None
+        if self.BATCH_EVAL and self.batch_evaluator is None:
+            from ChessHelpers.ChessBatchEvaluation import BatchEvaluator
+            self.batch_evaluator = BatchEvaluator(self.heuristics)
+
+    # forget everything learned during the last game (with SESSION, the next search starts cold)
+    def new_game(self):
+        self.tt.clear()
+        self.orderer.reset()
+        self.pv = []
+        if self.session is not None:
+            self.session.reset()
+
+    # stop the search as soon as the time for this move is up (or someone else tells us to stop)
+    # (like running out of time, the result of an unfinished search is thrown away)
+    def check_stop(self):
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            self.stopped = True
+        elif self.stop_event is not None and self.stop_event.is_set():
+            self.stopped = True
+        return self.stopped
+
+    # the search settings (DEPTH, QUIESCENCE, USE_TT...), to copy them to another MoveGenerator
+    def settings(self):
+        return {name: value for name, value in vars(self).items() if name.isupper()}
+
+    '''
+    Iterative Deepening
+    
+    Search to depth 1, then 2, then 3... until self.TIME_LIMIT runs out. Each iteration searches
+    the principal variation of the previous one first, so the deeper searches prune a lot more.
+    An iteration which runs out of time is thrown away, the move of the last completed one is used.
+    '''
 
+    def iterative_deepening(self, board, maximize, white, best_move, search_start=None):
+        if search_start is None:
+            search_start = time.perf_counter()
+        self.deadline = search_start + self.TIME_LIMIT
+        self.completed_depth = 0
 
-        # I also read that you can increase the efficiency of the pruning by ordering the moves
-        #
-        # here I make a new list of legal moves where moves that capture pieces are ordered first
-        unsorted_legal_moves = list(board.legal_moves)
-        legal_moves = []
-        # list the moves that capture a piece first
-        for m in unsorted_legal_moves:
-            if board.piece_at(m.to_square):
-                legal_moves.append(m)
-        for m in unsorted_legal_moves:
-            if not board.piece_at(m.to_square):
-                legal_moves.append(m)
-
-        if depth == 0 or len(legal_moves) == 0:  # check for 'terminal node' as well as max depth
-            score = self.heuristics.heuristic_2(board, white)
+        # no need to think if there is only one move
+        legal_moves = list(board.legal_moves)
+        if len(legal_moves) == 1:
+            best_move[0] = legal_moves[0]
+            return
+
+        score = 0
+        for depth in range(1, self.MAX_DEPTH + 1):
+            iteration_best_move = [None]
+            if self.ASPIRATION_WINDOW is not None and depth > 1:
+                alpha = score - self.ASPIRATION_WINDOW
+                beta = score + self.ASPIRATION_WINDOW
+            else:
+                alpha, beta = -10000, 10000
+            score = self.find_mini_max_move(board, depth, maximize, white, alpha, beta, iteration_best_move)
+            if (score <= alpha or score >= beta) and not self.stopped:
+                # the score fell outside of the aspiration window, search again with the full window
+                iteration_best_move = [None]
+                score = self.find_mini_max_move(board, depth, maximize, white, -10000, 10000, iteration_best_move)
+            if self.stopped:
+                # (if we ran out of time before even finishing depth 1,
+                #  a partially searched move is still better than a random one)
+                if best_move[0] is None:
+                    best_move[0] = iteration_best_move[0]
+                if self.stats is not None:
+                    self.stats.end_iteration(depth, score, self.pv_table[0] if self.pv_table else [], self.nodes,
+                                             self.quiescence_nodes, False)
+                break
+
+            best_move[0] = iteration_best_move[0]
+            self.pv = self.pv_table[0]
+            self.completed_depth = depth
+            if self.stats is not None:
+                self.stats.end_iteration(depth, score, self.pv, self.nodes, self.quiescence_nodes)
+            # (searching deeper won't change anything once we found a forced checkmate)
+            if time.perf_counter() >= self.deadline or abs(score) >= self.CHECKMATE / 2:
+                break
+
+    def find_mini_max_move(self, board, depth, maximize, white, alpha, beta, best_move, ply=0, allow_null=True):
+        if self.check_stop() is True:
+            return 0
+        self.nodes += 1
+        if self.stats is not None:
+            self.stats.node(ply)
+
+        # the principal variation found below this node
+        # (the pv table has one line per ply, each line is the best line starting at that ply)
+        while len(self.pv_table) <= ply:
+            self.pv_table.append([])
+        self.pv_table[ply] = []
+
+        # the search is written in "negamax" form:
+        #   every node maximizes its own score, and the score of a child is the negative of the
+        #   score the child returns. 'maximize' is still True at the nodes where the player who
+        #   started the search is to move, so the heuristic score gets flipped for the opponent.
+        #   alpha and beta are always from the point of view of the player to move at this node.
+        original_alpha = alpha
+
+        # transposition table
+        # if we searched this position before (through a different move order),
+        # we may be able to use the old score directly, or at least search its best move first
+        # (not at the leaves which are scored right away: looking them up costs about as much as scoring them)
+        use_tt = self.USE_TT and (depth > 0 or self.QUIESCENCE)
+        tt_move = None
+        if use_tt:
+            key = self.tt.key(board, white)
+            entry = self.tt.probe(key)
+            if entry is not None:
+                tt_move = entry.move
+                # (never cut at the root, we need to find the actual best move there)
+                if ply > 0 and (entry.depth == depth if self.TT_EXACT_DEPTH else entry.depth >= depth):
+                    if entry.bound == EXACT:
+                        return entry.score
+                    # a bound is only good enough if it is already outside of our window
+                    if entry.bound == LOWER and entry.score >= beta:
+                        return entry.score
+                    if entry.bound == UPPER and entry.score <= alpha:
+                        return entry.score
+
+        if depth == 0:
+            # (a leaf doesn't need its moves ordered, only to know if it has any)
+            legal_moves = None
+            context = NodeContext(board)
+        else:
+            legal_moves = self.order_moves(board, ply, tt_move)
+            context = NodeContext(board, legal_moves)
+
+        # endgame bitbases: we already know the result of this position, no need to search it
+        # (checkmates and stalemates are still scored below, a won position is worth less than a mate).
+        # if we are already in the bitbase endgame, they only score the leaves: the search still
+        # has to find the way to the checkmate
+        if self.bitbases is not None and ply > 0 and context.has_legal_moves() and \
+                (depth == 0 or not self.bitbase_root):
+            score = self.bitbases.score(board)
+            if score is not None:
+                return score
+
+        # check for 'terminal node' as well as max depth
+        if not context.has_legal_moves() or (depth == 0 and not self.QUIESCENCE):
+            score = self.evaluate(board, white, context)
+            if not maximize:
+                score = -score
+            if use_tt:
+                self.tt.store(key, depth, score, EXACT, None)
             return score
 
-        if maximize:
-            max_score = -10000
-            for move in legal_moves:
-                board.push(move)
-                score = self.find_mini_max_move(board, depth - 1, False, white, alpha, beta, best_move)
+        # at max depth, keep going until the captures have been played out
+        if depth == 0:
+            self.quiescence_limit = self.quiescence_nodes + self.QUIESCENCE_NODE_LIMIT
+            return self.quiescence(board, maximize, white, alpha, beta, self.QUIESCENCE_CHECKS, context)
+
+        in_check = (self.NULL_MOVE or self.LMR) and context.in_check()
+
+        # null move pruning
+        if self.NULL_MOVE and allow_null and ply > 0 and depth > self.NULL_MOVE_REDUCTION and not in_check \
+                and beta < self.CHECKMATE / 2 and self.has_pieces(board):
+            reduced_depth = depth - self.NULL_MOVE_REDUCTION
+            self.make_move(board, chess.Move.null())
+            score = -self.find_mini_max_move(board, reduced_depth - 1, not maximize, white,
+                                             -beta, -beta + NULL_WINDOW, best_move, ply + 1, False)
+            self.unmake_move(board)
+            if self.stopped:
+                return 0
+            if score >= beta and self.NULL_MOVE_VERIFY:
+                # verification: search our own moves at the reduced depth (without null moves)
+                score = self.find_mini_max_move(board, reduced_depth, maximize, white,
+                                                beta - NULL_WINDOW, beta, best_move, ply, False)
+                if self.stopped:
+                    return 0
+            if score >= beta:
+                return beta
+
+        # frontier node: all the children are leaves, score them in one go
+        # (not with quiescence or bitbases, those need to look at the leaves one by one)
+        if depth == 1 and self.BATCH_EVAL and not self.QUIESCENCE and self.bitbases is None:
+            max_score, node_best_move = self.search_frontier(board, maximize, white, alpha, beta, best_move, ply,
+                                                             legal_moves)
+            if self.USE_TT:
+                self.store_node(key, depth, max_score, original_alpha, beta, node_best_move)
+            return max_score
 
-                if score > max_score:
-                    max_score = score
+        max_score = -10000
+        node_best_move = None
+        for index, move in enumerate(legal_moves):
+            reduction = 0
+            if self.LMR and index >= self.LMR_MIN_MOVES and depth >= self.LMR_MIN_DEPTH and not in_check \
+                    and not board.is_capture(move) and not move.promotion and not self.orderer.is_killer(move, ply):
+                reduction = min(self.LMR_REDUCTIONS[min(depth, 63)][min(index, 63)], depth - 1)
+
+            self.make_move(board, move)
+            # (moves which give check are never reduced)
+            if reduction > 0 and board.is_check():
+                reduction = 0
+            if index > 0 and (self.PVS or reduction > 0):
+                # null window: we only need to know if this move is better than the best one so far
+                score = -self.find_mini_max_move(board, depth - 1 - reduction, not maximize, white,
+                                                 -alpha - NULL_WINDOW, -alpha, best_move, ply + 1)
+                if reduction > 0 and score > alpha and not self.stopped:
+                    # the reduced search says it is: verify at the full depth
+                    if self.PVS:
+                        score = -self.find_mini_max_move(board, depth - 1, not maximize, white,
+                                                         -alpha - NULL_WINDOW, -alpha, best_move, ply + 1)
+                    else:
+                        score = -self.find_mini_max_move(board, depth - 1, not maximize, white,
+                                                         -beta, -alpha, best_move, ply + 1)
+                if self.PVS and alpha < score < beta and not self.stopped:
+                    # it is, so now we need its actual score
+                    score = -self.find_mini_max_move(board, depth - 1, not maximize, white,
+                                                     -beta, -alpha, best_move, ply + 1)
+            else:
+                score = -self.find_mini_max_move(board, depth - 1, not maximize, white, -beta, -alpha, best_move, ply + 1)
+            self.unmake_move(board)
+            if self.stopped:
+                return 0
 
-                    # set the best move (I put it in an argument instead of a global var)
-                    if depth == self.DEPTH:
-                        best_move[0] = move
+            if score > max_score:
+                max_score = score
+                node_best_move = move
+                if score > alpha:
+                    self.pv_table[ply] = [move] + self.pv_table[ply + 1]
+
+                # set the best move (I put it in an argument instead of a global var)
+                if ply == 0:
+                    best_move[0] = move
+
+            # pruning
+            # update "minimum guaranteed score"
+            if max_score > alpha:
+                alpha = max_score
+
+            # pruning
+            # skip if move is better than best move opponent will allow
+            if alpha >= beta:
+                self.orderer.record_cutoff(board, move, ply, depth, index)
+                if self.stats is not None:
+                    self.stats.cutoff(index)
+                break
+
+        if self.USE_TT:
+            self.store_node(key, depth, max_score, original_alpha, beta, node_best_move)
+
+        return max_score
+
+    # store the result of a node in the transposition table (with the bound type from the window)
+    def store_node(self, key, depth, max_score, original_alpha, beta, node_best_move):
+        if max_score <= original_alpha:
+            bound = UPPER
+        elif max_score >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.tt.store(key, depth, max_score, bound, node_best_move)
 
-                # pruning
-                # update "minimum guaranteed score"
-                if max_score > alpha:
-                    alpha = max_score
+    '''
+    Frontier Node (depth 1)
+    
+    The first move causes a cutoff most of the time (see ChessMoveOrdering.py), so it is scored on its own.
+    If it doesn't, the positions after all the other moves are scored with one call to the batch evaluator.
+    The best move is picked exactly like the move loop of find_mini_max_move would (same pruning and cutoffs).
+    '''
 
-                # pruning
-                # skip if move is better than best move opponent will allow
-                if max_score >= beta:
-                    board.pop()
-                    break
+    def search_frontier(self, board, maximize, white, alpha, beta, best_move, ply, legal_moves):
+        max_score = -10000
+        node_best_move = None
+        scores = None
+        for index, move in enumerate(legal_moves):
+            # (the children are scored from the point of view of the player who started the search)
+            if index == 0:
+                self.make_move(board, move)
+                score = self.evaluate(board, white)
+                self.unmake_move(board)
+                self.nodes += 1
+                if self.stats is not None:
+                    self.stats.node(ply + 1)
+            else:
+                if scores is None:
+                    scores = self.batch_evaluator.evaluate_children(board, legal_moves[1:], white)
+                    self.nodes += len(legal_moves) - 1
+                    if self.stats is not None:
+                        self.stats.node(ply + 1, len(legal_moves) - 1)
+                        self.stats.leaf_evaluations += len(legal_moves) - 1
+                score = float(scores[index - 1])
+            if not maximize:
+                score = -score
 
-                board.pop()
-            return max_score
+            if score > max_score:
+                max_score = score
+                node_best_move = move
+                if score > alpha:
+                    self.pv_table[ply] = [move]
+                if ply == 0:
+                    best_move[0] = move
+            if max_score > alpha:
+                alpha = max_score
+            if alpha >= beta:
+                self.orderer.record_cutoff(board, move, ply, 1, index)
+                if self.stats is not None:
+                    self.stats.cutoff(index)
+                break
+        return max_score, node_best_move
+
+    # does the player to move have anything besides pawns and the king?
+    def has_pieces(self, board):
+        return bool(board.occupied_co[board.turn] & ~(board.pawns | board.kings))
+
+    # I also read that you can increase the efficiency of the pruning by ordering the moves
+    # (see ChessMoveOrdering.py: pv and transposition table moves first, then captures by MVV-LVA,
+    #  then killer moves, then the other quiet moves by their history score)
+    def order_moves(self, board, ply, tt_move=None):
+        pv_move = self.pv[ply] if ply < len(self.pv) else None
+        return self.orderer.order(board, list(board.legal_moves), ply, pv_move, tt_move)
+
+    # make and unmake moves during the search (keeping the incremental evaluation up to date)
+    def make_move(self, board, move):
+        if self.accumulator is not None:
+            self.accumulator.push(board, move)
+        else:
+            board.push(move)
 
+    def unmake_move(self, board):
+        if self.accumulator is not None:
+            self.accumulator.pop(board)
         else:
-            min_score = 10000
-            for move in legal_moves:
-                board.push(move)
-                score = self.find_mini_max_move(board, depth - 1, True, white, alpha, beta, best_move)
-
-                if score < min_score:
-                    min_score = score
-                    # hehe your best move can't be one of your opponent's moves
-                    # if depth == self.DEPTH:
-                    #    best_move[0] = move
-
-                # pruning: update beta value
-                if min_score < beta:
-                    beta = min_score
-
-                # pruning
-                # skip if worse than the worst score we can be forced to accept
-                if min_score <= alpha:
-                    board.pop()
-                    break
-
-                board.pop()
-            return min_score
+            board.pop()
+
+    # score a leaf node with heuristic #2
+    def evaluate(self, board, white, context=None):
+        if self.stats is not None:
+            self.stats.leaf_evaluations += 1
+        if self.accumulator is not None:
+            if self.DEBUG_EVAL:
+                self.accumulator.verify(board)
+            return self.accumulator.heuristic_2(board, white, context)
+        return self.heuristics.heuristic_2(board, white, context=context)
+
+    '''
+    Quiescence Search
+    
+    Only looks at captures and promotions (and checks, if checks=True) and lets the side to move
+    "stand pat": it can always decline to capture, so the static score is a lower bound of its score.
+    When in check, every move is searched since standing pat is not an option.
+    Like find_mini_max_move, the scores are from the point of view of the player to move.
+    (context: the NodeContext find_mini_max_move already made for this position, if any)
+    '''
+
+    def quiescence(self, board, maximize, white, alpha, beta, checks=False, context=None):
+        if self.check_stop() is True:
+            return 0
+        self.quiescence_nodes += 1
+
+        if context is None:
+            context = NodeContext(board)
+        in_check = context.in_check()
+        if in_check:
+            moves = context.legal_moves()
+            if len(moves) == 0 or self.quiescence_nodes >= self.quiescence_limit:
+                score = self.evaluate(board, white, context)
+                return score if maximize else -score
+            max_score = -10000
+        else:
+            stand_pat = self.evaluate(board, white, context)
+            if not maximize:
+                stand_pat = -stand_pat
+            if stand_pat >= beta or self.quiescence_nodes >= self.quiescence_limit:
+                return stand_pat
+            if stand_pat > alpha:
+                alpha = stand_pat
+            max_score = stand_pat
+            moves = [m for m in context.legal_moves()
+                     if m.promotion or board.is_capture(m) or (checks and board.gives_check(m))]
+
+        # capture the most valuable pieces first
+        moves.sort(key=lambda m: self.orderer.capture_score(board, m), reverse=True)
+
+        for move in moves:
+            self.make_move(board, move)
+            score = -self.quiescence(board, not maximize, white, -beta, -alpha)
+            self.unmake_move(board)
+            if self.stopped:
+                return 0
+
+            if score > max_score:
+                max_score = score
+            if max_score > alpha:
+                alpha = max_score
+            if alpha >= beta:
+                break
 
+        return max_score
@@ -0,0 +1,81 @@
+# Chess Evaluation Cache
+#
+# This file contains a cache for the heuristic scores in ChessHeuristics.py. The same positions are
+# scored over and over, within a search (transpositions) and across the moves of a game (the next
+# search looks at mostly the same positions again). With a cache set on Heuristics, heuristic_1 and
+# heuristic_2 only score a position the first time they see it (heuristic_3 also scores the piece
+# which was just captured, which isn't on the board, so only its heuristic #2 part is cached).
+#
+# The cache has a fixed memory budget: once it is full, the least recently used position is evicted.
+# It can be shared by several Heuristics/MoveGenerators (and threads) of the same process:
+# > generator_2.heuristics.cache = generator_1.heuristics.cache
+
+import threading
+from collections import OrderedDict
+
+# approximate memory used by one entry (the key tuple and its integers, the score, and the dict entry)
+ENTRY_BYTES = 600
+
+
+class EvaluationCache:
+    def __init__(self, max_bytes=32 * 2**20):
+        self.max_bytes = max_bytes
+        self.capacity = max(1, max_bytes // ENTRY_BYTES)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    '''
+    The key of a position for one heuristic, from one player's point of view
+    (the pieces, side to move, castling rights and en passant square, which is everything
+    heuristic_1 and heuristic_2 look at, plus any extra arguments of the heuristic)
+    '''
+
+    def key(self, heuristic, board, white, *args):
+        return (heuristic, white, board.pawns, board.knights, board.bishops, board.rooks, board.queens,
+                board.kings, board.occupied_co[True], board.turn, board.castling_rights, board.ep_square) + args
+
+    # returns the cached score, or None
+    def get(self, key):
+        with self.lock:
+            score = self.entries.get(key)
+            if score is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return score
+
+    def put(self, key, score):
+        with self.lock:
+            self.entries[key] = score
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def hit_rate(self):
+        probes = self.hits + self.misses
+        return self.hits / probes if probes else 0.0
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate(),
+        }
@@ -3,9 +3,111 @@
 # This file contains the chess heuristics which we have designed
 # and which are used to score our chess positions in ChessEngineHelper.py
 
+import math
+import time
+import functools
 import chess
 global best_move
 
+PIECE_TYPES = (chess.PAWN, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN, chess.KING)
+
+# square masks for the evaluation terms
+BB_DIAGONAL_A1_H8 = (chess.BB_A1 | chess.BB_B2 | chess.BB_C3 | chess.BB_D4 |
+                     chess.BB_E5 | chess.BB_F6 | chess.BB_G7 | chess.BB_H8)
+BB_DIAGONAL_A8_H1 = (chess.BB_A8 | chess.BB_B7 | chess.BB_C6 | chess.BB_D5 |
+                     chess.BB_E4 | chess.BB_F3 | chess.BB_G2 | chess.BB_H1)
+# the squares scored by control_center (e3, f3, e4, f4)
+BB_CONTROL_CENTER = chess.BB_E3 | chess.BB_F3 | chess.BB_E4 | chess.BB_F4
+CENTER_PIECE_SCORE = {chess.PAWN: 1, chess.KNIGHT: 2, chess.BISHOP: 2, chess.ROOK: 2, chess.QUEEN: 3, chess.KING: 2}
+
+# the terms recorded by the evaluation profiler, and how much each one is worth in the heuristics
+# (the heuristics themselves are profiled too, their time includes the time of their terms)
+PROFILED_TERMS = ("heuristic_1", "heuristic_2", "heuristic_3", "score_material", "control_diagonals",
+                  "control_center", "mobility", "mobility_advanced")
+TERM_WEIGHTS = {"heuristic_1": 1, "heuristic_2": 1, "heuristic_3": 1, "score_material": 1,
+                "control_diagonals": 1 / 5, "control_center": 1 / 4, "mobility": 1 / 30, "mobility_advanced": 1 / 10}
+
+
+# returns the bitboards of all pieces of each type (in PIECE_TYPES order, both colors)
+def piece_masks(board):
+    return board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings
+
+
+# sliding piece attacks (the first piece in each direction is included)
+def diagonal_attacks(square, occupied):
+    return chess.BB_DIAG_ATTACKS[square][chess.BB_DIAG_MASKS[square] & occupied]
+
+
+def straight_attacks(square, occupied):
+    return (chess.BB_RANK_ATTACKS[square][chess.BB_RANK_MASKS[square] & occupied] |
+            chess.BB_FILE_ATTACKS[square][chess.BB_FILE_MASKS[square] & occupied])
+
+
+'''
+Node Context
+
+what the search and the heuristics need to know about the legal moves of a position, worked out at most
+once per node: python-chess generates the legal moves again for every is_checkmate(), is_stalemate()
+and legal_moves.count(). The legal moves are only generated if they are needed (or passed in,
+if the search already has them), otherwise it just checks if there is at least one.
+'''
+
+
+class NodeContext:
+    __slots__ = ("board", "moves", "check", "has_moves")
+
+    def __init__(self, board, legal_moves=None):
+        self.board = board
+        self.moves = legal_moves
+        self.check = None
+        self.has_moves = None if legal_moves is None else len(legal_moves) > 0
+
+    def legal_moves(self):
+        if self.moves is None:
+            self.moves = list(self.board.legal_moves)
+            self.has_moves = len(self.moves) > 0
+        return self.moves
+
+    def in_check(self):
+        if self.check is None:
+            self.check = self.board.is_check()
+        return self.check
+
+    def has_legal_moves(self):
+        if self.has_moves is None:
+            self.has_moves = any(self.board.generate_legal_moves())
+        return self.has_moves
+
+    def is_checkmate(self):
+        return not self.has_legal_moves() and self.in_check()
+
+    def is_stalemate(self):
+        return not self.has_legal_moves() and not self.in_check()
+
+
+# the heuristic scores are cached if Heuristics.cache is set (see ChessEvaluationCache.py)
+# (only the outermost heuristic: heuristic_2 calls heuristic_1, and caching both would store
+#  two entries for every position, and look it up twice)
+def cached_heuristic(method):
+    name = method.__name__
+
+    @functools.wraps(method)
+    def cached_method(self, board, white, *args, context=None):
+        if self.cache is None or self.scoring:
+            return method(self, board, white, *args, context=context)
+        key = self.cache.key(name, board, white, *args)
+        score = self.cache.get(key)
+        if score is None:
+            self.scoring = True
+            try:
+                score = method(self, board, white, *args, context=context)
+            finally:
+                self.scoring = False
+            self.cache.put(key, score)
+        return score
+
+    return cached_method
+
 
 class Heuristics:
     def __init__(self):
@@ -13,6 +115,42 @@ class Heuristics:
         self.STALEMATE = 0
         self.piece_score = {"k": 0, "q": 10, "r": 5, "b": 3, "n": 3, "p": 1}
         self.mobility_piece_score = {"k": 4, "q": 10, "r": 5, "b": 3, "n": 3, "p": 1}
+        self.profile = None
+        self.cache = None
+        self.scoring = False  # inside a cached heuristic (see cached_heuristic)
+
+    '''
+    Profiling mode
+    
+    Between start_profile() and stop_profile(), every call of a heuristic or heuristic term is timed,
+    and its value recorded (see EvaluationProfile). The terms are only wrapped while profiling,
+    so there is no cost at all when it's off.
+    '''
+
+    def start_profile(self):
+        self.stop_profile()
+        self.profile = EvaluationProfile()
+        for name in PROFILED_TERMS:
+            setattr(self, name, self.profiled(name, getattr(self, name)))
+        return self.profile
+
+    def stop_profile(self):
+        profile = self.profile
+        for name in PROFILED_TERMS:
+            self.__dict__.pop(name, None)
+        self.profile = None
+        return profile
+
+    def profiled(self, name, method):
+        profile = self.profile
+
+        def profiled_method(*args, **kwargs):
+            start = time.perf_counter()
+            value = method(*args, **kwargs)
+            profile.record(name, time.perf_counter() - start, value)
+            return value
+
+        return profiled_method
 
     """
     Heuristic #1
@@ -22,47 +160,42 @@ class Heuristics:
         1. each piece is worth +points if it is yours, and -points if it is your opponents
         2. special case for checkmate (+/- 1000 points)
         3. special case for stalemate (0 points)
+        
+    (context: the NodeContext of the board, if the caller already has one)
     """
-    def heuristic_1(self, board, white):
-        # case 1: return +1000 if it is checkmate and we win
-        if board.is_checkmate() and (white and board.turn == chess.BLACK or
-                                     not white and board.turn == chess.WHITE):
-            return self.CHECKMATE
-
-        # case 2: return -1000 if it is checkmate and we lose
-        if board.is_checkmate() and (not white and board.turn == chess.BLACK or
-                                     white and board.turn == chess.WHITE):
+    @cached_heuristic
+    def heuristic_1(self, board, white, context=None):
+        if context is None:
+            context = NodeContext(board)
+
+        if context.is_checkmate():
+            # case 1: return +1000 if it is checkmate and we win
+            if white and board.turn == chess.BLACK or not white and board.turn == chess.WHITE:
+                return self.CHECKMATE
+
+            # case 2: return -1000 if it is checkmate and we lose
             return -self.CHECKMATE
 
         # case 3: return 0 if it is a stalemate
-        if board.is_stalemate():
+        if context.is_stalemate():
             return self.STALEMATE
 
         # case 4: otherwise return the board score
         return self.score_material(board, white)
 
     def score_material(self, board, white):
-        chess_board = MakeMatrix().convert_to_matrix(board)
+        # count the pieces straight from python-chess's bitboards
+        # (one bit per square, so the number of pieces is the number of bits set)
         score = 0
-        count_black = 0
-        count_white = 0
-        for row in chess_board:
-            for cell in row:
-                color = cell[0]
-                piece_type = cell[1]
-                if color == "w":
-                    count_white += 1
-                    score += self.piece_score[piece_type]
-                elif color == "b":
-                    count_black += 1
-                    score -= self.piece_score[piece_type]
+        white_pieces = board.occupied_co[chess.WHITE]
+        black_pieces = board.occupied_co[chess.BLACK]
+        for piece_type, mask in zip(PIECE_TYPES, piece_masks(board)):
+            value = self.piece_score[chess.piece_symbol(piece_type)]
+            score += value * (chess.popcount(mask & white_pieces) - chess.popcount(mask & black_pieces))
 
         # since we calculated the score for white,
         # simply invert the score if we are playing black
         # (otherwise the AI will always maximize white's position)
-        # if (my_turn and board.turn == chess.BLACK) \
-        #        or (not my_turn and board.turn == chess.WHITE):
-        #    score = -score
         if white is False:
             score = -score
         return score
@@ -77,9 +210,10 @@ class Heuristics:
         3. scores boards based on diagonal control
         
     """
-    def heuristic_2(self, board, white):
+    @cached_heuristic
+    def heuristic_2(self, board, white, context=None):
         # generate the initial score with heuristic #1
-        score = self.heuristic_1(board, white)
+        score = self.heuristic_1(board, white, context=context)
 
         # then, complement the score with our additional heuristics!
         # dividing by some constant because it seems likely that position is
@@ -94,95 +228,21 @@ class Heuristics:
         # This procedure determines if diagonals are controlled by bishops or queen
 
         # Define figures capable of controlling the diagonals
-        diagonal_figures = ["b", "q"]
+        diagonal_figures = (board.bishops | board.queens) & board.occupied_co[chess.WHITE if white else chess.BLACK]
 
-        # set initial heuristic to zero
-        diagonal_heuristics = 0
-
-        # Convert board
-        chess_board = MakeMatrix().convert_to_matrix(board)
-
-        # Define diagonals
-        black_diagonal = [chess_board[1][1], chess_board[2][2], chess_board[3][3], chess_board[4][4],
-                          chess_board[5][5], chess_board[6][6], chess_board[7][7], chess_board[0][0]]
-
-        white_diagonal = [chess_board[0][7], chess_board[1][6], chess_board[2][5], chess_board[3][4],
-                          chess_board[4][3], chess_board[5][2], chess_board[6][1], chess_board[7][0]]
-
-        for cell in black_diagonal:
-            for figure in diagonal_figures:
-                if figure == cell[1]:
-                    if (cell[0] == "w" and white) or (cell[0] == "b" and not white):
-                        diagonal_heuristics += 3
-        for cell in white_diagonal:
-            for figure in diagonal_figures:
-                if figure == cell[1]:
-                    if (cell[0] == "w" and white) or (cell[0] == "b" and not white):
-                        diagonal_heuristics += 3
-
-        return diagonal_heuristics
+        # 3 points for every one of our bishops or queens on either long diagonal
+        # (the two diagonals never cross, so no piece is counted twice)
+        return 3 * chess.popcount(diagonal_figures & (BB_DIAGONAL_A1_H8 | BB_DIAGONAL_A8_H1))
 
     # function to score board based on control of center squares
     # Mike K https://github.com/fieldsher
     def control_center(self, board, white):
         # This procedure will give heuristic points for control of central squares
 
-        # Convert board
-        chess_board = MakeMatrix().convert_to_matrix(board)
-
-        # define central squares: e4, e5, d4, d5
-        central_squares = [chess_board[4][4], chess_board[4][5], chess_board[5][4], chess_board[5][5]]
-
-        # Define squares can be used to control central squares by pawns
-        white_pawn_squares = [chess_board[3][3], chess_board[4][3], chess_board[5][3], chess_board[6][3],
-                              chess_board[4][3], chess_board[4][4], chess_board[4][5], chess_board[4][6]]
-
-        black_pawn_squares = [chess_board[3][6], chess_board[4][6], chess_board[5][6], chess_board[6][6],
-                              chess_board[3][5], chess_board[4][5], chess_board[5][5], chess_board[5][6]]
-
-        # Define squares can be used to control central squares by knights
-        knight_squares = [chess_board[3][2], chess_board[4][2], chess_board[5][2], chess_board[6][2],
-                          chess_board[2][3], chess_board[3][3], chess_board[6][3], chess_board[7][3],
-                          chess_board[2][4], chess_board[7][4], chess_board[2][5], chess_board[7][5],
-                          chess_board[2][6], chess_board[3][6], chess_board[6][6], chess_board[7][6],
-                          chess_board[3][7], chess_board[4][7], chess_board[5][7], chess_board[6][7]]
-
-        # Set control center heuristics to 0
+        # Give points for each piece in central square (of either color)
         ccHeuristic = 0
-
-        # Give points for each piece in central square (pawn or knight)
-
-        for square in central_squares:
-            if square[1] == "p":
-                ccHeuristic += 1
-            elif square[1] == "n":
-                ccHeuristic += 2
-            elif square[1] == "b":
-                ccHeuristic += 2
-            elif square[1] == "r":
-                ccHeuristic += 2
-            elif square[1] == "q":
-                ccHeuristic += 3
-            elif square[1] == "k":
-                ccHeuristic += 2
-
-        # Give points for white pawns in controlling positions
-        if white:
-            for square in white_pawn_squares:
-                if square == "p":
-                    ccHeuristic += 1
-
-        # Give points for black pawns in controlling positions
-        if not white:
-            for square in black_pawn_squares:
-                if square == "p":
-                    ccHeuristic += 1
-
-        # Give points for knights controlling central squares
-
-        for square in knight_squares:
-            if square == "n":
-                ccHeuristic += 2
+        for piece_type, mask in zip(PIECE_TYPES, piece_masks(board)):
+            ccHeuristic += CENTER_PIECE_SCORE[piece_type] * chess.popcount(mask & BB_CONTROL_CENTER)
 
         return ccHeuristic
 
@@ -197,223 +257,249 @@ class Heuristics:
         4. scores boards based on number of legal moves
         5. scores boards based on piece mobility
 
+    (not cached: the score depends on the piece player_move captured, which isn't on the board anymore,
+    but the heuristic #2 part of it is)
     """
-    def heuristic_3(self, board, white, player_move):
+    def heuristic_3(self, board, white, player_move, context=None):
+        if context is None:
+            context = NodeContext(board)
+
         # generate the initial score with heuristic #2
-        score = self.heuristic_2(board, white)
+        score = self.heuristic_2(board, white, context=context)
 
         # then, complement the score with our additional heuristics again!
         # can scale these down too: average ~30 available moves
-        score += self.mobility(board, white) / 30
-        score += self.mobility_advanced(board, white, player_move) / 10
+        score += self.mobility(board, context) / 30
+        score += self.mobility_advanced(board, player_move) / 10
         return score
 
     # mobility - number of legal moves available to a player after the current move
     # - Rajashree P
-    def mobility(self, board):
+    def mobility(self, board, context=None):
+        if context is not None:
+            return len(context.legal_moves())
         return board.legal_moves.count()
 
     # mobility - number of pieces attacked + number pieces defended
-
-    def get_rook_score_for_mobility_advanced(self, chess_board, row, col):
-        score = 0
-
-        row_index = row + 1
-        col_index = col
-
-        while row_index <= 7:
-            piece_type = chess_board[row_index][col_index][1]
-            if piece_type != "-":
-                score += self.mobility_piece_score[piece_type]
-                break
-            row_index += 1
-
-        row_index = row - 1
-
-        while row_index >= 0:
-            piece_type = chess_board[row_index][col_index][1]
-            if piece_type != "-":
-                score += self.mobility_piece_score[piece_type]
-                break
-            row_index -= 1
-
-        row_index = row
-        col_index = col + 1
-
-        while col_index <= 7:
-            piece_type = chess_board[row_index][col_index][1]
-            if piece_type != "-":
-                score += self.mobility_piece_score[piece_type]
-                break
-            col_index += 1
-
-        col_index = col - 1
-
-        while col_index >= 0:
-            piece_type = chess_board[row_index][col_index][1]
-            if piece_type != "-":
-                score += self.mobility_piece_score[piece_type]
-                break
-            col_index -= 1
-
-        return score
-
-    def get_bishop_score_for_mobility_advanced(self, chess_board, row, col):
-        score = 0
-
-        row_index = row + 1
-        col_index = col + 1
-
-        while row_index <= 7 and col_index <= 7:
-            piece_type = chess_board[row_index][col_index][1]
-            if piece_type != "-":
-                score += self.mobility_piece_score[piece_type]
-                break
-            row_index += 1
-            col_index += 1
-
-        row_index = row - 1
-        col_index = col - 1
-
-        while row_index >= 0 and col_index >= 0:
-            piece_type = chess_board[row_index][col_index][1]
-            if piece_type != "-":
-                score += self.mobility_piece_score[piece_type]
-                break
-            row_index -= 1
-            col_index -= 1
-
-        row_index = row + 1
-        col_index = col - 1
-
-        while row_index <= 7 and col_index >= 0:
-            piece_type = chess_board[row_index][col_index][1]
-            if piece_type != "-":
-                score += self.mobility_piece_score[piece_type]
-                break
-            row_index += 1
-            col_index -= 1
-
-        row_index = row - 1
-        col_index = col + 1
-
-        while row_index >= 0 and col_index <= 7:
-            piece_type = chess_board[row_index][col_index][1]
-            if piece_type != "-":
-                score += self.mobility_piece_score[piece_type]
-                break
-            row_index -= 1
-            col_index += 1
-
-        return score
-
-    def get_score_for_mobility_advanced(self, chess_board, row_index, col_index):
-        score = 0
-
-        if 0 <= row_index <= 7 and 0 <= col_index <= 7:
-            piece_type = chess_board[row_index][col_index][1]
-            if piece_type != "-":
-                score += self.mobility_piece_score[piece_type]
-
-        return score
-
     def mobility_advanced(self, board, player_move):
-        # Convert board
-        chess_board = MakeMatrix().convert_to_matrix(board)
+        to_square = player_move.to_square
+        cur_piece_type = board.piece_type_at(to_square)
 
         score = 0
 
-        to_square = player_move.to_square
-        row = 7 - int(to_square / 8)
-        col = to_square % 8
-        cur_color = chess_board[row][col][0]
-        cur_piece_type = chess_board[row][col][1]
-
+        # points for capturing a white piece
         board.pop()
-        temp_chess_board = MakeMatrix().convert_to_matrix(board)
-        temp_color = temp_chess_board[row][col][0]
-        temp_piece_type = temp_chess_board[row][col][1]
-        if temp_color == "w" and temp_piece_type != "-":
-            score += self.mobility_piece_score[temp_piece_type]
+        captured_piece = board.piece_at(to_square)
         board.push(player_move)
-        chess_board = MakeMatrix().convert_to_matrix(board)
-
-        # knight
-        if cur_piece_type == "n":
-            offset = [-2, -1, 1, 2]
-            for row_offset in offset:
-                for col_offset in offset:
-                    if abs(row_offset) + abs(col_offset) == 3:
-                        new_row_pos = row + row_offset
-                        new_col_pos = col + col_offset
-                        if 0 <= new_row_pos <= 7 and 0 <= new_col_pos <= 7:
-                            piece_type = chess_board[new_row_pos][new_col_pos][1]
-                            if piece_type != "-":
-                                score += self.mobility_piece_score[piece_type]
-
-        # queen
-        if cur_piece_type == "q":
-            score += self.get_rook_score_for_mobility_advanced(chess_board, row, col)
-            score += self.get_bishop_score_for_mobility_advanced(chess_board, row, col)
-
-        # rook
-        if cur_piece_type == "r":
-            score += self.get_rook_score_for_mobility_advanced(chess_board, row, col)
-
-        # bishop
-        if cur_piece_type == "b":
-            score += self.get_bishop_score_for_mobility_advanced(chess_board, row, col)
-
-        # pawn
-        if cur_piece_type == "p":
-            row_index = row + 1
-            col_index = col + 1
+        if captured_piece is not None and captured_piece.color == chess.WHITE:
+            score += self.mobility_piece_score[captured_piece.symbol().lower()]
+
+        # points for every piece (of either color) the moved piece attacks or defends
+        occupied = board.occupied
+        if cur_piece_type == chess.KNIGHT:
+            attacks = chess.BB_KNIGHT_ATTACKS[to_square]
+        elif cur_piece_type == chess.BISHOP:
+            attacks = diagonal_attacks(to_square, occupied)
+        elif cur_piece_type == chess.ROOK:
+            attacks = straight_attacks(to_square, occupied)
+        elif cur_piece_type == chess.QUEEN:
+            attacks = diagonal_attacks(to_square, occupied) | straight_attacks(to_square, occupied)
+        elif cur_piece_type == chess.PAWN:
+            # (pawns are scored by the squares diagonally towards rank 1, for both colors)
+            attacks = chess.BB_PAWN_ATTACKS[chess.BLACK][to_square]
+        elif cur_piece_type == chess.KING:
+            attacks = chess.BB_KING_ATTACKS[to_square]
+        else:
+            attacks = chess.BB_EMPTY
+
+        attacks &= occupied
+        if attacks:
+            for piece_type, mask in zip(PIECE_TYPES, piece_masks(board)):
+                if mask & attacks:
+                    score += self.mobility_piece_score[chess.piece_symbol(piece_type)] * chess.popcount(mask & attacks)
 
-            score += self.get_score_for_mobility_advanced(chess_board, row_index, col_index)
-
-            col_index = col - 1
-
-            score += self.get_score_for_mobility_advanced(chess_board, row_index, col_index)
-
-        # king
-        if cur_piece_type == "k":
-            row_index = row + 1
-            col_index = col + 1
-
-            score += self.get_score_for_mobility_advanced(chess_board, row_index, col_index)
-
-            col_index = col - 1
-
-            score += self.get_score_for_mobility_advanced(chess_board, row_index, col_index)
-
-            row_index = row - 1
-            col_index = col - 1
-
-            score += self.get_score_for_mobility_advanced(chess_board, row_index, col_index)
-
-            col_index = col + 1
-
-            score += self.get_score_for_mobility_advanced(chess_board, row_index, col_index)
+        return score
 
-            row_index = row + 1
-            col_index = col
 
-            score += self.get_score_for_mobility_advanced(chess_board, row_index, col_index)
+"""
+Evaluation Accumulator
+
+keeps the terms of heuristic #2 up to date while the search makes and unmakes moves:
+
+    push() only looks at the squares the move changes (moved, captured and promoted pieces,
+    and the rook when castling) and pop() restores the terms from before the move,
+    so scoring a leaf no longer needs to look at all 64 squares
+"""
+
+
+class EvaluationAccumulator:
+    def __init__(self, heuristics, board):
+        self.heuristics = heuristics
+        self.reset(board)
+
+    def reset(self, board):
+        # material: white's material minus black's material
+        # diagonals: points for white's and black's bishops and queens on the long diagonals
+        # center: points for the pieces of either color in the center squares
+        self.material = self.heuristics.score_material(board, True)
+        self.diagonals_white = self.heuristics.control_diagonals(board, True)
+        self.diagonals_black = self.heuristics.control_diagonals(board, False)
+        self.center = self.heuristics.control_center(board, True)
+        self.stack = []
+
+    # the terms contributed by the pieces on the given squares
+    def square_terms(self, board, squares):
+        material = diagonals_white = diagonals_black = center = 0
+        for square in squares:
+            piece = board.piece_at(square)
+            if piece is None:
+                continue
+            value = self.heuristics.piece_score[piece.symbol().lower()]
+            material += value if piece.color == chess.WHITE else -value
+            if piece.piece_type in (chess.BISHOP, chess.QUEEN) and \
+                    chess.BB_SQUARES[square] & (BB_DIAGONAL_A1_H8 | BB_DIAGONAL_A8_H1):
+                if piece.color == chess.WHITE:
+                    diagonals_white += 3
+                else:
+                    diagonals_black += 3
+            if chess.BB_SQUARES[square] & BB_CONTROL_CENTER:
+                center += CENTER_PIECE_SCORE[piece.piece_type]
+        return material, diagonals_white, diagonals_black, center
+
+    # the squares whose contents change when the move is made
+    def changed_squares(self, board, move):
+        if board.is_castling(move):
+            # (the king and rook squares are all on the back rank)
+            return chess.SquareSet(chess.BB_RANKS[chess.square_rank(move.from_square)])
+        if board.is_en_passant(move):
+            captured = chess.square(chess.square_file(move.to_square), chess.square_rank(move.from_square))
+            return move.from_square, move.to_square, captured
+        return move.from_square, move.to_square
+
+    def push(self, board, move):
+        self.stack.append((self.material, self.diagonals_white, self.diagonals_black, self.center))
+        if not move:
+            # (a null move doesn't change any pieces)
+            board.push(move)
+            return
+        squares = self.changed_squares(board, move)
+        before = self.square_terms(board, squares)
+        board.push(move)
+        after = self.square_terms(board, squares)
+        self.material += after[0] - before[0]
+        self.diagonals_white += after[1] - before[1]
+        self.diagonals_black += after[2] - before[2]
+        self.center += after[3] - before[3]
+
+    def pop(self, board):
+        board.pop()
+        self.material, self.diagonals_white, self.diagonals_black, self.center = self.stack.pop()
+
+    # same score as Heuristics.heuristic_2, from the accumulated terms
+    # (and cached under the same key, if the heuristics have a cache)
+    def heuristic_2(self, board, white, context=None):
+        cache = self.heuristics.cache
+        if cache is not None:
+            key = cache.key("heuristic_2", board, white)
+            score = cache.get(key)
+            if score is not None:
+                return score
+
+        if context is None:
+            context = NodeContext(board)
+        if context.is_checkmate():
+            score = -self.heuristics.CHECKMATE if board.turn == white else self.heuristics.CHECKMATE
+        elif context.is_stalemate():
+            score = self.heuristics.STALEMATE
+        else:
+            score = self.material if white else -self.material
+
+        score += (self.diagonals_white if white else self.diagonals_black) / 5
+        score += self.center / 4
+        if cache is not None:
+            cache.put(key, score)
+        return score
 
-            row_index = row - 1
+    # debug mode: compare the accumulated terms against scoring the whole board
+    def verify(self, board):
+        expected = (self.heuristics.score_material(board, True),
+                    self.heuristics.control_diagonals(board, True),
+                    self.heuristics.control_diagonals(board, False),
+                    self.heuristics.control_center(board, True))
+        actual = (self.material, self.diagonals_white, self.diagonals_black, self.center)
+        if actual != expected:
+            raise AssertionError("Incremental evaluation " + str(actual) + " does not match " +
+                                 str(expected) + " for " + board.fen())
 
-            score += self.get_score_for_mobility_advanced(chess_board, row_index, col_index)
 
-            row_index = row
-            col_index = col + 1
+"""
+Evaluation Profile
 
-            score += self.get_score_for_mobility_advanced(chess_board, row_index, col_index)
+call count, total and mean time of every heuristic term, and how much its value varies between positions:
+a term which takes a lot of time but hardly changes the score (small weighted standard deviation)
+is a good candidate to drop
+"""
 
-            col_index = col - 1
 
-            score += self.get_score_for_mobility_advanced(chess_board, row_index, col_index)
+class TermProfile:
+    __slots__ = ("calls", "time", "mean", "m2", "min", "max")
 
-        return score
+    def __init__(self):
+        self.calls = 0
+        self.time = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, elapsed, value):
+        self.calls += 1
+        self.time += elapsed
+        # running mean and variance (Welford)
+        delta = value - self.mean
+        self.mean += delta / self.calls
+        self.m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def std(self):
+        return math.sqrt(self.m2 / self.calls) if self.calls else 0.0
+
+
+class EvaluationProfile:
+    def __init__(self):
+        self.terms = {name: TermProfile() for name in PROFILED_TERMS}
+
+    def record(self, name, elapsed, value):
+        self.terms[name].record(elapsed, value)
+
+    def as_dict(self):
+        result = {}
+        for name, term in self.terms.items():
+            if term.calls == 0:
+                continue
+            result[name] = {
+                "calls": term.calls,
+                "total_time": term.time,
+                "mean_time": term.time / term.calls,
+                "mean": term.mean,
+                "std": term.std(),
+                "min": term.min,
+                "max": term.max,
+                "weight": TERM_WEIGHTS[name],
+                # (how much the term actually moves the score)
+                "weighted_std": term.std() * TERM_WEIGHTS[name],
+            }
+        return result
+
+    def table(self):
+        lines = ["%-18s %9s %10s %9s %9s %8s %12s" %
+                 ("term", "calls", "total ms", "mean us", "mean", "std", "weighted std")]
+        for name, term in self.as_dict().items():
+            lines.append("%-18s %9d %10.1f %9.2f %9.2f %8.2f %12.3f" %
+                         (name, term["calls"], term["total_time"] * 1000, term["mean_time"] * 1e6,
+                          term["mean"], term["std"], term["weighted_std"]))
+        return "\n".join(lines)
 
 
 class MakeMatrix:
@@ -0,0 +1,449 @@
+# Chess Heuristics Check
+#
+# This file checks the bitboard heuristics in ChessHeuristics.py against the original implementation,
+# which read every term from a MakeMatrix of the board (MatrixHeuristics below, kept as it was).
+# On a corpus of positions (the game in chess_moves.txt and random playouts) it compares the score of
+# every term, and measures the evaluations per second of heuristic #2 with both implementations:
+# > python -m ChessHelpers.ChessHeuristicsCheck
+#
+# (run it after changing any of the terms: it exits with 1 if a score is different)
+
+import os
+import sys
+import random
+import time
+import argparse
+import chess
+from ChessHelpers.ChessHeuristics import Heuristics, MakeMatrix
+
+GAME_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "chess_moves.txt")
+
+# the terms which are compared (the heuristics are sums of these)
+TERMS = ("score_material", "control_diagonals", "control_center", "mobility_advanced")
+
+
+'''
+The evaluation terms as they were written before the bitboard version (unchanged), for reference
+'''
+
+
+class MatrixHeuristics:
+    def __init__(self):
+        self.piece_score = {"k": 0, "q": 10, "r": 5, "b": 3, "n": 3, "p": 1}
+        self.mobility_piece_score = {"k": 4, "q": 10, "r": 5, "b": 3, "n": 3, "p": 1}
+
+    def heuristic_2(self, board, white):
+        score = self.score_material(board, white)
+        score += self.control_diagonals(board, white) / 5
+        score += self.control_center(board, white) / 4
+        return score
+
+    def score_material(self, board, white):
+        chess_board = MakeMatrix().convert_to_matrix(board)
+        score = 0
+        count_black = 0
+        count_white = 0
+        for row in chess_board:
+            for cell in row:
+                color = cell[0]
+                piece_type = cell[1]
+                if color == "w":
+                    count_white += 1
+                    score += self.piece_score[piece_type]
+                elif color == "b":
+                    count_black += 1
+                    score -= self.piece_score[piece_type]
+
+        # since we calculated the score for white,
+        # simply invert the score if we are playing black
+        # (otherwise the AI will always maximize white's position)
+        # if (my_turn and board.turn == chess.BLACK) \
+        #        or (not my_turn and board.turn == chess.WHITE):
+        #    score = -score
+        if white is False:
+            score = -score
+        return score
+
+    def control_diagonals(self, board, white):
+        # This procedure determines if diagonals are controlled by bishops or queen
+
+        # Define figures capable of controlling the diagonals
+        diagonal_figures = ["b", "q"]
+
+        # set initial heuristic to zero
+        diagonal_heuristics = 0
+
+        # Convert board
+        chess_board = MakeMatrix().convert_to_matrix(board)
+
+        # Define diagonals
+        black_diagonal = [chess_board[1][1], chess_board[2][2], chess_board[3][3], chess_board[4][4],
+                          chess_board[5][5], chess_board[6][6], chess_board[7][7], chess_board[0][0]]
+
+        white_diagonal = [chess_board[0][7], chess_board[1][6], chess_board[2][5], chess_board[3][4],
+                          chess_board[4][3], chess_board[5][2], chess_board[6][1], chess_board[7][0]]
+
+        for cell in black_diagonal:
+            for figure in diagonal_figures:
+                if figure == cell[1]:
+                    if (cell[0] == "w" and white) or (cell[0] == "b" and not white):
+                        diagonal_heuristics += 3
+        for cell in white_diagonal:
+            for figure in diagonal_figures:
+                if figure == cell[1]:
+                    if (cell[0] == "w" and white) or (cell[0] == "b" and not white):
+                        diagonal_heuristics += 3
+
+        return diagonal_heuristics
+
+    def control_center(self, board, white):
+        # This procedure will give heuristic points for control of central squares
+
+        # Convert board
+        chess_board = MakeMatrix().convert_to_matrix(board)
+
+        # define central squares: e4, e5, d4, d5
+        central_squares = [chess_board[4][4], chess_board[4][5], chess_board[5][4], chess_board[5][5]]
+
+        # Define squares can be used to control central squares by pawns
+        white_pawn_squares = [chess_board[3][3], chess_board[4][3], chess_board[5][3], chess_board[6][3],
+                              chess_board[4][3], chess_board[4][4], chess_board[4][5], chess_board[4][6]]
+
+        black_pawn_squares = [chess_board[3][6], chess_board[4][6], chess_board[5][6], chess_board[6][6],
+                              chess_board[3][5], chess_board[4][5], chess_board[5][5], chess_board[5][6]]
+
+        # Define squares can be used to control central squares by knights
+        knight_squares = [chess_board[3][2], chess_board[4][2], chess_board[5][2], chess_board[6][2],
+                          chess_board[2][3], chess_board[3][3], chess_board[6][3], chess_board[7][3],
+                          chess_board[2][4], chess_board[7][4], chess_board[2][5], chess_board[7][5],
+                          chess_board[2][6], chess_board[3][6], chess_board[6][6], chess_board[7][6],
+                          chess_board[3][7], chess_board[4][7], chess_board[5][7], chess_board[6][7]]
+
+        # Set control center heuristics to 0
+        ccHeuristic = 0
+
+        # Give points for each piece in central square (pawn or knight)
+
+        for square in central_squares:
+            if square[1] == "p":
+                ccHeuristic += 1
+            elif square[1] == "n":
+                ccHeuristic += 2
+            elif square[1] == "b":
+                ccHeuristic += 2
+            elif square[1] == "r":
+                ccHeuristic += 2
+            elif square[1] == "q":
+                ccHeuristic += 3
+            elif square[1] == "k":
+                ccHeuristic += 2
+
+        # Give points for white pawns in controlling positions
+        if white:
+            for square in white_pawn_squares:
+                if square == "p":
+                    ccHeuristic += 1
+
+        # Give points for black pawns in controlling positions
+        if not white:
+            for square in black_pawn_squares:
+                if square == "p":
+                    ccHeuristic += 1
+
+        # Give points for knights controlling central squares
+
+        for square in knight_squares:
+            if square == "n":
+                ccHeuristic += 2
+
+        return ccHeuristic
+
+    def get_rook_score_for_mobility_advanced(self, chess_board, row, col):
+        score = 0
+
+        row_index = row + 1
+        col_index = col
+
+        while row_index <= 7:
+            piece_type = chess_board[row_index][col_index][1]
+            if piece_type != "-":
+                score += self.mobility_piece_score[piece_type]
+                break
+            row_index += 1
+
+        row_index = row - 1
+
+        while row_index >= 0:
+            piece_type = chess_board[row_index][col_index][1]
+            if piece_type != "-":
+                score += self.mobility_piece_score[piece_type]
+                break
+            row_index -= 1
+
+        row_index = row
+        col_index = col + 1
+
+        while col_index <= 7:
+            piece_type = chess_board[row_index][col_index][1]
+            if piece_type != "-":
+                score += self.mobility_piece_score[piece_type]
+                break
+            col_index += 1
+
+        col_index = col - 1
+
+        while col_index >= 0:
+            piece_type = chess_board[row_index][col_index][1]
+            if piece_type != "-":
+                score += self.mobility_piece_score[piece_type]
+                break
+            col_index -= 1
+
+        return score
+
+    def get_bishop_score_for_mobility_advanced(self, chess_board, row, col):
+        score = 0
+
+        row_index = row + 1
+        col_index = col + 1
+
+        while row_index <= 7 and col_index <= 7:
+            piece_type = chess_board[row_index][col_index][1]
+            if piece_type != "-":
+                score += self.mobility_piece_score[piece_type]
+                break
+            row_index += 1
+            col_index += 1
+
+        row_index = row - 1
+        col_index = col - 1
+
+        while row_index >= 0 and col_index >= 0:
+            piece_type = chess_board[row_index][col_index][1]
+            if piece_type != "-":
+                score += self.mobility_piece_score[piece_type]
+                break
+            row_index -= 1
+            col_index -= 1
+
+        row_index = row + 1
+        col_index = col - 1
+
+        while row_index <= 7 and col_index >= 0:
+            piece_type = chess_board[row_index][col_index][1]
+            if piece_type != "-":
+                score += self.mobility_piece_score[piece_type]
+                break
+            row_index += 1
+            col_index -= 1
+
+        row_index = row - 1
+        col_index = col + 1
+
+        while row_index >= 0 and col_index <= 7:
+            piece_type = chess_board[row_index][col_index][1]
+            if piece_type != "-":
+                score += self.mobility_piece_score[piece_type]
+                break
+            row_index -= 1
+            col_index += 1
+
+        return score
+
+    def get_score_for_mobility_advanced(self, chess_board, row_index, col_index):
+        score = 0
+
+        if 0 <= row_index <= 7 and 0 <= col_index <= 7:
+            piece_type = chess_board[row_index][col_index][1]
+            if piece_type != "-":
+                score += self.mobility_piece_score[piece_type]
+
+        return score
+
+    def mobility_advanced(self, board, player_move):
+        # Convert board
+        chess_board = MakeMatrix().convert_to_matrix(board)
+
+        score = 0
+
+        to_square = player_move.to_square
+        row = 7 - int(to_square / 8)
+        col = to_square % 8
+        cur_color = chess_board[row][col][0]
+        cur_piece_type = chess_board[row][col][1]
+
+        board.pop()
+        temp_chess_board = MakeMatrix().convert_to_matrix(board)
+        temp_color = temp_chess_board[row][col][0]
+        temp_piece_type = temp_chess_board[row][col][1]
+        if temp_color == "w" and temp_piece_type != "-":
+            score += self.mobility_piece_score[temp_piece_type]
+        board.push(player_move)
+        chess_board = MakeMatrix().convert_to_matrix(board)
+
+        # knight
+        if cur_piece_type == "n":
+            offset = [-2, -1, 1, 2]
+            for row_offset in offset:
+                for col_offset in offset:
+                    if abs(row_offset) + abs(col_offset) == 3:
+                        new_row_pos = row + row_offset
+                        new_col_pos = col + col_offset
+                        if 0 <= new_row_pos <= 7 and 0 <= new_col_pos <= 7:
+                            piece_type = chess_board[new_row_pos][new_col_pos][1]
+                            if piece_type != "-":
+                                score += self.mobility_piece_score[piece_type]
+
+        # queen
+        if cur_piece_type == "q":
+            score += self.get_rook_score_for_mobility_advanced(chess_board, row, col)
+            score += self.get_bishop_score_for_mobility_advanced(chess_board, row, col)
+
+        # rook
+        if cur_piece_type == "r":
+            score += self.get_rook_score_for_mobility_advanced(chess_board, row, col)
+
+        # bishop
+        if cur_piece_type == "b":
+            score += self.get_bishop_score_for_mobility_advanced(chess_board, row, col)
+
+        # pawn
+        if cur_piece_type == "p":
+            row_index = row + 1
+            col_index = col + 1
+
+            score += self.get_score_for_mobility_advanced(chess_board, row_index, col_index)
+
+            col_index = col - 1
+
+            score += self.get_score_for_mobility_advanced(chess_board, row_index, col_index)
+
+        # king
+        if cur_piece_type == "k":
+            row_index = row + 1
+            col_index = col + 1
+
+            score += self.get_score_for_mobility_advanced(chess_board, row_index, col_index)
+
+            col_index = col - 1
+
+            score += self.get_score_for_mobility_advanced(chess_board, row_index, col_index)
+
+            row_index = row - 1
+            col_index = col - 1
+
+            score += self.get_score_for_mobility_advanced(chess_board, row_index, col_index)
+
+            col_index = col + 1
+
+            score += self.get_score_for_mobility_advanced(chess_board, row_index, col_index)
+
+            row_index = row + 1
+            col_index = col
+
+            score += self.get_score_for_mobility_advanced(chess_board, row_index, col_index)
+
+            row_index = row - 1
+
+            score += self.get_score_for_mobility_advanced(chess_board, row_index, col_index)
+
+            row_index = row
+            col_index = col + 1
+
+            score += self.get_score_for_mobility_advanced(chess_board, row_index, col_index)
+
+            col_index = col - 1
+
+            score += self.get_score_for_mobility_advanced(chess_board, row_index, col_index)
+
+        return score
+
+
+'''
+The positions to check: every position of the game in chess_moves.txt, and the positions of random
+playouts from the starting position (with a fixed seed, so every run checks the same positions).
+Returns a list of (board, move) with the move that was just played on the board
+'''
+
+
+def corpus(playouts=200, max_plies=120, seed=0):
+    positions = []
+
+    board = chess.Board()
+    with open(GAME_PATH) as file:
+        for line in file:
+            # (lines look like "12. Nf3 Nc6")
+            for san in line.split()[1:]:
+                move = board.parse_san(san)
+                board.push(move)
+                positions.append((board.copy(), move))
+
+    rng = random.Random(seed)
+    for _ in range(playouts):
+        board = chess.Board()
+        while not board.is_game_over() and len(board.move_stack) < max_plies:
+            move = rng.choice(list(board.legal_moves))
+            board.push(move)
+            positions.append((board.copy(), move))
+    return positions
+
+
+'''
+Compares every term for both players on all the positions:
+returns the mismatches as a list of (fen, move, term, white, expected score, score)
+'''
+
+
+def check_equivalence(positions=None):
+    positions = positions if positions is not None else corpus()
+    heuristics = Heuristics()
+    reference = MatrixHeuristics()
+    mismatches = []
+    for board, move in positions:
+        for white in (True, False):
+            for term in TERMS:
+                if term == "mobility_advanced":
+                    expected = reference.mobility_advanced(board, move)
+                    score = heuristics.mobility_advanced(board, move)
+                else:
+                    expected = getattr(reference, term)(board, white)
+                    score = getattr(heuristics, term)(board, white)
+                if score != expected:
+                    mismatches.append((board.fen(), move.uci(), term, white, expected, score))
+    return mismatches
+
+
+# evaluations per second of heuristic #2 (the score of the search's leaves) with both implementations
+def benchmark(positions=None):
+    positions = positions if positions is not None else corpus()
+    boards = [board for board, _ in positions]
+    heuristics = Heuristics()
+    results = {}
+    for name, heuristic_2 in (("matrix", MatrixHeuristics().heuristic_2), ("bitboard", heuristics.heuristic_2)):
+        start = time.perf_counter()
+        for board in boards:
+            heuristic_2(board, True)
+        results[name] = len(boards) / (time.perf_counter() - start)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the heuristics against the MakeMatrix implementation.")
+    parser.add_argument("--playouts", type=int, default=200, help="number of random playouts in the corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    positions = corpus(args.playouts, seed=args.seed)
+    mismatches = check_equivalence(positions)
+    for fen, move, term, white, expected, score in mismatches[:20]:
+        print("MISMATCH %s (%s) %s white=%s: expected %s, got %s" % (fen, move, term, white, expected, score))
+    print("%d positions, %d mismatches" % (len(positions), len(mismatches)))
+
+    rates = benchmark(positions)
+    print("heuristic_2: %.0f evals/sec with MakeMatrix, %.0f evals/sec with bitboards (%.1fx)" %
+          (rates["matrix"], rates["bitboard"], rates["bitboard"] / rates["matrix"]))
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
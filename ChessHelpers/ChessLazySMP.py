@@ -0,0 +1,242 @@
+# Chess Lazy SMP
+#
+# This file contains a "Lazy SMP" version of the mini max search in ChessEngineHelper.py.
+# Instead of splitting the work, every helper process searches the same position as the main
+# search, just at slightly different depths and with a slightly different move order.
+# The processes only communicate through a transposition table in shared memory: whenever a
+# helper already searched a position, the main search can use its result instead of searching it.
+#
+# Requires numpy:
+# > pip install numpy
+
+import os
+import random
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor, wait
+import numpy as np
+import chess
+from ChessHelpers.ChessEngineHelper import MoveGenerator
+from ChessHelpers.ChessTranspositionTable import TranspositionTable, REPLACEMENT_POLICIES
+
+# every slot of the shared table is two 64-bit words:
+#   data:  the packed entry (score, depth, bound type and best move)
+#   check: the position's key XOR data
+# processes write to the table without any locks, so a slot may be read while another process is
+# halfway through writing it. Such a torn entry doesn't pass check ^ data == key and is ignored.
+SHARED_TT_DTYPE = np.dtype([("check", "<u8"), ("data", "<u8")])
+
+# scores are multiples of 0.05, so they are stored exactly as whole hundredths
+SCORE_SCALE = 100
+SCORE_OFFSET = 2**31
+
+
+def pack_move(move):
+    if move is None:
+        return 0
+    return 1 + move.from_square + (move.to_square << 6) + ((move.promotion or 0) << 12)
+
+
+def unpack_move(packed):
+    if packed == 0:
+        return None
+    packed -= 1
+    return chess.Move(packed & 63, (packed >> 6) & 63, (packed >> 12) or None)
+
+
+def pack_entry(depth, score, bound, move):
+    return (pack_move(move) | (bound << 16) | (depth << 18) |
+            ((int(round(score * SCORE_SCALE)) + SCORE_OFFSET) << 32))
+
+
+class SharedTTEntry:
+    __slots__ = ("key", "depth", "score", "bound", "move")
+
+    def __init__(self, key, data):
+        self.key = key
+        self.move = unpack_move(data & 0xFFFF)
+        self.bound = (data >> 16) & 3
+        self.depth = (data >> 18) & 0xFF
+        self.score = ((data >> 32) - SCORE_OFFSET) / SCORE_SCALE
+
+
+'''
+A transposition table with the same interface as TranspositionTable, stored as a numpy structured
+array in a multiprocessing.shared_memory block. The process which creates it owns the block and
+unlinks it in close(), the others attach to it by name.
+(the hit/miss/collision counters are kept separately by every process)
+'''
+
+
+class SharedTranspositionTable(TranspositionTable):
+    def __init__(self, size=2**20, replacement="depth", name=None):
+        if replacement not in REPLACEMENT_POLICIES:
+            raise ValueError("Unknown replacement policy: " + str(replacement))
+        self.size = size
+        self.replacement = replacement
+        # (the entries have no generation: with a search session, stale entries are kept like any other)
+        self.generation = 0
+        self.owner = name is None
+        if self.owner:
+            self.memory = shared_memory.SharedMemory(create=True, size=size * SHARED_TT_DTYPE.itemsize)
+        else:
+            try:
+                # (the process which created the block is responsible for cleaning it up)
+                self.memory = shared_memory.SharedMemory(name=name, track=False)
+            except TypeError:  # Python < 3.13
+                self.memory = shared_memory.SharedMemory(name=name)
+        self.name = self.memory.name
+        self.table = np.ndarray((size,), dtype=SHARED_TT_DTYPE, buffer=self.memory.buf)
+        self.checks = self.table["check"]
+        self.data = self.table["data"]
+        if self.owner:
+            self.table[:] = 0
+        self.reset_stats()
+
+    def probe(self, key):
+        index = key % self.size
+        data = int(self.data[index])
+        check = int(self.checks[index])
+        if data == 0 and check == 0:
+            self.misses += 1
+            return None
+        if check ^ data != key:
+            self.misses += 1
+            self.collisions += 1
+            return None
+        self.hits += 1
+        return SharedTTEntry(key, data)
+
+    def store(self, key, depth, score, bound, move):
+        index = key % self.size
+        old_data = int(self.data[index])
+        if old_data != 0 and self.replacement == "depth":
+            old_depth = (old_data >> 18) & 0xFF
+            old_key = int(self.checks[index]) ^ old_data
+            if old_depth > depth:
+                # (same position: still remember the newer best move if the old entry had none)
+                if old_key == key and old_data & 0xFFFF == 0 and move is not None:
+                    data = old_data | pack_move(move)
+                    self.data[index] = data
+                    self.checks[index] = key ^ data
+                return
+        data = pack_entry(depth, score, bound, move)
+        self.data[index] = data
+        self.checks[index] = key ^ data
+        self.stores += 1
+
+    def clear(self):
+        self.table[:] = 0
+        self.reset_stats()
+
+    def close(self):
+        self.checks = self.data = self.table = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+# a helper search with its own move order
+# (the moves after the pv/transposition table moves are shuffled a bit differently by every helper)
+class HelperMoveGenerator(MoveGenerator):
+    def __init__(self, tt, index):
+        super().__init__()
+        self.tt = tt
+        self.index = index
+        self.random = random.Random(index)
+
+    def order_moves(self, board, ply, tt_move=None):
+        legal_moves = super().order_moves(board, ply, tt_move)
+        pv_move = self.pv[ply] if ply < len(self.pv) else None
+        first = len({m for m in (pv_move, tt_move) if m is not None and m in legal_moves})
+        rest = legal_moves[first:]
+        self.random.shuffle(rest)
+        return legal_moves[:first] + rest
+
+
+# state of a helper process
+_helper_tt = None
+_helper_stop = None
+
+
+def _init_helper(name, size, replacement, stop_event):
+    global _helper_tt, _helper_stop
+    _helper_tt = SharedTranspositionTable(size, replacement, name=name)
+    _helper_stop = stop_event
+
+
+# keep searching deeper and deeper (starting at a staggered depth) until the main search is done
+def _helper_search(board, settings, index):
+    generator = HelperMoveGenerator(_helper_tt, index)
+    for name, value in settings.items():
+        setattr(generator, name, value)
+    generator.stop_event = _helper_stop
+    generator.start_search(board, clear_tt=False)
+    generator.tt.reset_stats()
+
+    white = board.turn == chess.WHITE
+    depth = 1 + index % 2
+    while depth <= generator.MAX_DEPTH and not generator.stopped:
+        generator.find_mini_max_move(board, depth, True, white, -10000, 10000, [None])
+        if not generator.stopped:
+            generator.pv = generator.pv_table[0]
+        depth += 1
+    return generator.tt.stats()
+
+
+'''
+Lazy SMP Mini Max
+
+The main search is the normal mini_max_move (fixed DEPTH or iterative deepening with TIME_LIMIT),
+while WORKERS - 1 helper processes search the same position and fill the shared transposition
+table. The helpers are stopped as soon as the main search is done, and the main search's move is
+played. Unlike ParallelMoveGenerator, the move may differ from the serial search's move.
+'''
+
+
+class LazySMPMoveGenerator(MoveGenerator):
+    def __init__(self, workers=None, tt_size=2**20, replacement="depth"):
+        super().__init__()
+        self.WORKERS = workers if workers is not None else os.cpu_count()
+        self.tt = SharedTranspositionTable(tt_size, replacement)
+        self.executor = None
+        self.helpers = []
+        self.helper_stop = None
+        self.helper_stats = []
+
+    def start_workers(self):
+        if self.executor is None and self.WORKERS > 1:
+            self.helper_stop = multiprocessing.Event()
+            self.executor = ProcessPoolExecutor(max_workers=self.WORKERS - 1, initializer=_init_helper,
+                                                initargs=(self.tt.name, self.tt.size, self.tt.replacement,
+                                                          self.helper_stop))
+
+    def close(self):
+        self.stop_helpers()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+        self.tt.close()
+
+    # the helpers start as soon as the main search has cleared the table
+    def start_search(self, board, clear_tt=True):
+        super().start_search(board, clear_tt)
+        self.start_workers()
+        if self.executor is not None:
+            self.helper_stop.clear()
+            settings = self.settings()
+            self.helpers = [self.executor.submit(_helper_search, board.copy(), settings, index)
+                            for index in range(1, self.WORKERS)]
+
+    def stop_helpers(self):
+        if self.helpers:
+            self.helper_stop.set()
+            wait(self.helpers)
+            self.helper_stats = [helper.result() for helper in self.helpers if helper.exception() is None]
+            self.helpers = []
+
+    def mini_max_move(self, board):
+        try:
+            return super().mini_max_move(board)
+        finally:
+            self.stop_helpers()
@@ -0,0 +1,134 @@
+# Chess Move Ordering
+#
+# This file contains the move ordering used by the mini max search in ChessEngineHelper.py.
+# Alpha-beta pruning only prunes if the best move is searched first, so the better the moves are
+# ordered, the fewer positions need to be searched. The moves are searched in this order:
+#
+#   1. the move from the previous principal variation, and the best move from the transposition table
+#   2. captures and promotions: most valuable victim first, then least valuable attacker (MVV-LVA)
+#   3. killer moves: quiet moves which caused a cutoff at the same ply somewhere else in the tree
+#   4. all the other quiet moves, by their history score: how often (and how deep) they caused a cutoff
+
+import chess
+
+# piece values for MVV-LVA
+# (the king only ever attacks, and should be the last piece to capture with)
+PIECE_VALUES = {chess.PAWN: 1, chess.KNIGHT: 3, chess.BISHOP: 3, chess.ROOK: 5, chess.QUEEN: 10, chess.KING: 20}
+
+# move categories (the higher, the earlier the move is searched)
+PV_MOVE = 5
+TT_MOVE = 4
+CAPTURE = 3
+KILLER = 2
+QUIET = 1
+
+KILLER_SLOTS = 2
+
+
+class MoveOrderer:
+    def __init__(self, killers=True, history=True):
+        self.use_killers = killers
+        self.use_history = history
+        self.killers = []
+        # butterfly table: history[color][from_square][to_square]
+        self.history = []
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.reset()
+
+    def reset(self):
+        self.killers = []
+        self.history = [[[0] * 64 for _ in range(64)] for _ in range(2)]
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    '''
+    Keeps what was learned for the next search of the same game, plies moves later:
+    the killers move up by that many plies, and the history scores are halved so that
+    the cutoffs of the new search soon outweigh the old ones
+    '''
+
+    def age(self, plies):
+        self.killers = self.killers[plies:]
+        for color in self.history:
+            for scores in color:
+                for to_square in range(64):
+                    scores[to_square] >>= 1
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    '''
+    MVV-LVA score of a capture or promotion (0 for quiet moves)
+    '''
+
+    def capture_score(self, board, move):
+        score = 0
+        if board.is_en_passant(move):
+            score = PIECE_VALUES[chess.PAWN] * 10
+        else:
+            victim = board.piece_type_at(move.to_square)
+            if victim is not None:
+                score = PIECE_VALUES[victim] * 10
+        if move.promotion:
+            score += PIECE_VALUES[move.promotion] * 10
+        if score:
+            score -= PIECE_VALUES[board.piece_type_at(move.from_square)]
+        return score
+
+    def order(self, board, moves, ply, pv_move=None, tt_move=None):
+        killers = self.killers[ply] if self.use_killers and ply < len(self.killers) else ()
+        history = self.history[board.turn]
+
+        def key(move):
+            if move == pv_move:
+                return PV_MOVE, 0
+            if move == tt_move:
+                return TT_MOVE, 0
+            capture = self.capture_score(board, move)
+            if capture:
+                return CAPTURE, capture
+            if move in killers:
+                return KILLER, -killers.index(move)
+            if self.use_history:
+                return QUIET, history[move.from_square][move.to_square]
+            return QUIET, 0
+
+        # (sorting is stable, so moves with the same key stay in the order they were generated)
+        return sorted(moves, key=key, reverse=True)
+
+    def is_killer(self, move, ply):
+        return self.use_killers and ply < len(self.killers) and move in self.killers[ply]
+
+    '''
+    Called by the search whenever a move causes a beta cutoff
+    '''
+
+    def record_cutoff(self, board, move, ply, depth, index):
+        self.cutoffs += 1
+        if index == 0:
+            self.first_move_cutoffs += 1
+
+        # only quiet moves are killers and get history points, captures are ordered well enough
+        if self.capture_score(board, move):
+            return
+
+        if self.use_killers:
+            while len(self.killers) <= ply:
+                self.killers.append([])
+            killers = self.killers[ply]
+            if move not in killers:
+                killers.insert(0, move)
+                del killers[KILLER_SLOTS:]
+
+        if self.use_history:
+            self.history[board.turn][move.from_square][move.to_square] += depth * depth
+
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def stats(self):
+        return {
+            "cutoffs": self.cutoffs,
+            "first_move_cutoffs": self.first_move_cutoffs,
+            "first_move_cutoff_rate": self.first_move_cutoff_rate(),
+        }
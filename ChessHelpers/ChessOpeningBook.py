@@ -0,0 +1,67 @@
+# Chess Opening Book
+#
+# This file contains an opening book layer which can be put in front of any move generator.
+# There is no need to search the first moves of a game from scratch: if the position is in a
+# Polyglot (.bin) opening book, the book move is played instantly, otherwise the move generator
+# is asked for a move as usual.
+#
+# The book is never loaded into memory: python-chess memory maps the file (mmap) and looks up
+# positions with a binary search on the sorted 64-bit Zobrist keys of the book entries.
+
+import random
+import functools
+import chess.polyglot
+
+# how to choose between several book moves for the same position
+#   "weighted": random move, more likely the higher its weight (more variety between games)
+#   "best": always the move with the highest weight
+SELECTION_MODES = ("weighted", "best")
+
+
+class OpeningBook:
+    def __init__(self, path, selection="weighted", max_ply=None):
+        if selection not in SELECTION_MODES:
+            raise ValueError("Unknown selection mode: " + str(selection))
+        self.reader = chess.polyglot.open_reader(path)
+        self.selection = selection
+        self.max_ply = max_ply  # stop using the book after this many plies (None = never)
+        self.random = random.Random()
+        self.hits = 0
+        self.misses = 0
+
+    '''
+    Returns a book move for the position, or None if the position is not in the book
+    '''
+
+    def book_move(self, board):
+        if self.max_ply is not None and board.ply() >= self.max_ply:
+            return None
+        try:
+            if self.selection == "best":
+                entry = self.reader.find(board)
+            else:
+                entry = self.reader.weighted_choice(board, random=self.random)
+        except IndexError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry.move
+
+    '''
+    Puts the book in front of a move generator: returns a new move generator function
+    which plays the book move if there is one, and otherwise calls the original one
+    (which is kept in its __wrapped__, so inspect.unwrap() finds e.g. the MoveGenerator behind it)
+    '''
+
+    def wrap(self, move_generator):
+        @functools.wraps(move_generator)
+        def book_move_generator(board):
+            move = self.book_move(board)
+            if move is not None:
+                return move
+            return move_generator(board)
+
+        return book_move_generator
+
+    def close(self):
+        self.reader.close()
@@ -0,0 +1,201 @@
+# Chess Parallel Search
+#
+# This file contains a parallel version of the mini max search in ChessEngineHelper.py.
+# The moves at the root of the search are split across a pool of worker processes, and every
+# worker searches the subtree of one root move at a time with the normal find_mini_max_move.
+#
+# The workers share the best score found so far (alpha), so a move which is searched late can
+# use it to prune, just like the serial search does for every move after the first one.
+
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import chess
+from ChessHelpers.ChessEngineHelper import MoveGenerator
+
+# the heuristic scores are multiples of 0.05, so lowering the shared alpha by a smaller margin
+# guarantees that a move which ties the best score is still scored exactly (and not just as an
+# upper bound), and we can break ties by move order exactly like the serial search does
+TIE_MARGIN = 0.01
+
+BENCHMARK_FENS = [
+    "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3",
+    "r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4",
+    "r1bq1rk1/pp2bppp/2n1pn2/2pp4/3P4/2PBPN2/PP1N1PPP/R1BQ1RK1 w - - 0 8",
+    "r2q1rk1/pb1nbppp/1p2pn2/2pp4/3P4/1P1BPN2/PBPN1PPP/R2Q1RK1 w - - 2 10",
+    "6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1",
+    "8/5k2/8/3K4/8/8/4P3/8 w - - 0 1",
+]
+
+# state of a worker process
+_worker_generator = None
+_worker_search_id = None
+_shared_alpha = None
+
+
+def _init_worker(shared_alpha):
+    global _worker_generator, _shared_alpha
+    _worker_generator = MoveGenerator()
+    _shared_alpha = shared_alpha
+
+
+# search the subtree of one root move (runs in a worker process)
+def _search_root_move(board, move, settings, search_id):
+    global _worker_search_id
+    generator = _worker_generator
+    for name, value in settings.items():
+        setattr(generator, name, value)
+    # (the transposition table is kept between the root moves of the same search)
+    if search_id != _worker_search_id:
+        generator.start_search(board)
+        _worker_search_id = search_id
+    elif generator.accumulator is not None:
+        generator.accumulator.reset(board)
+
+    white = board.turn == chess.WHITE
+    alpha = _shared_alpha.value - TIE_MARGIN
+    generator.make_move(board, move)
+    score = -generator.find_mini_max_move(board, generator.DEPTH - 1, False, white,
+                                          -10000, -alpha, [None], 1)
+    pv = [move] + generator.pv_table[1]
+    generator.unmake_move(board)
+
+    with _shared_alpha.get_lock():
+        if score > _shared_alpha.value:
+            _shared_alpha.value = score
+    return score, pv
+
+
+class ParallelMoveGenerator(MoveGenerator):
+    def __init__(self, workers=None):
+        super().__init__()
+        self.WORKERS = workers if workers is not None else os.cpu_count()
+        # (the root moves are searched in different processes, in a different order than the serial
+        #  search, so their transposition tables only give the same scores with exact depth cutoffs)
+        self.TT_EXACT_DEPTH = True
+        self.executor = None
+        self.shared_alpha = None
+        self.search_id = 0
+
+    def start_workers(self):
+        if self.executor is None:
+            self.shared_alpha = multiprocessing.Value("d", -10000.0)
+            self.executor = ProcessPoolExecutor(max_workers=self.WORKERS, initializer=_init_worker,
+                                                initargs=(self.shared_alpha,))
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    '''
+    Parallel Mini Max
+    
+    Searches the first root move on its own to get a good alpha, then all the other root moves
+    at the same time. The root moves are ordered like the serial search orders them, and ties are
+    broken by that order, so the move is the same as MoveGenerator.mini_max_move would play
+    with TT_EXACT_DEPTH (as long as QUIESCENCE_NODE_LIMIT is never reached, and without NULL_MOVE and LMR,
+    which prune differently depending on the window). TIME_LIMIT is not used, this always
+    searches to the fixed DEPTH.
+    '''
+
+    def mini_max_move(self, board):
+        legal_move_count = board.legal_moves.count()
+        if legal_move_count == 0:
+            return None
+        # (the serial search starts its own search: start_search must only run once per move, with
+        #  SESSION it ages the transposition table and the history scores)
+        if self.DEPTH < 2 or legal_move_count == 1 or self.WORKERS < 2:
+            return super().mini_max_move(board)
+
+        # (order the root moves exactly like the serial search does at the start of its search)
+        self.start_search(board)
+        legal_moves = self.order_moves(board, 0)
+
+        self.start_workers()
+        self.search_id += 1
+        self.shared_alpha.value = -10000.0
+        settings = self.settings()
+
+        # results[i] = (score, pv) of legal_moves[i]
+        results = [None] * len(legal_moves)
+        first = self.executor.submit(_search_root_move, board, legal_moves[0], settings, self.search_id)
+        futures = {first: 0}
+        if self.wait_for(futures, results):
+            futures = {self.executor.submit(_search_root_move, board, move, settings, self.search_id): i
+                       for i, move in enumerate(legal_moves) if i > 0}
+            self.wait_for(futures, results)
+
+        # (if the search was cancelled through stop_event, like the serial search: the best of the moves
+        #  searched so far, or the move which would have been searched first)
+        best_index = 0
+        for i, result in enumerate(results):
+            if result is not None and (results[best_index] is None or result[0] > results[best_index][0]):
+                best_index = i
+        self.pv = results[best_index][1] if results[best_index] is not None else []
+        self.completed_depth = 0 if self.stopped else self.DEPTH
+        return legal_moves[best_index]
+
+    # collect the results (returns False, and sets stopped, if the search was cancelled through stop_event)
+    def wait_for(self, futures, results):
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=0.05, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[futures[future]] = future.result()
+            if self.stop_event is not None and self.stop_event.is_set():
+                self.stopped = True
+                self.close()
+                return False
+        return True
+
+
+'''
+Compares a parallel search against the serial search on the benchmark positions
+and returns the time taken by both, the speedup and whether they chose the same moves
+'''
+
+
+def benchmark_parallel(fens=None, depth=4, workers=None, parallel=None):
+    fens = fens if fens is not None else BENCHMARK_FENS
+    # (any parallel move generator can be compared, the default is root move splitting)
+    parallel = parallel if parallel is not None else ParallelMoveGenerator(workers)
+    parallel.DEPTH = depth
+    serial = MoveGenerator()
+    serial.DEPTH = depth
+    serial.TT_EXACT_DEPTH = parallel.TT_EXACT_DEPTH
+    parallel.start_workers()
+
+    report = {"depth": depth, "workers": parallel.WORKERS, "positions": []}
+    serial_total = parallel_total = 0
+    for fen in fens:
+        start = time.perf_counter()
+        serial_move = serial.mini_max_move(chess.Board(fen))
+        serial_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        parallel_move = parallel.mini_max_move(chess.Board(fen))
+        parallel_time = time.perf_counter() - start
+
+        serial_total += serial_time
+        parallel_total += parallel_time
+        report["positions"].append({"fen": fen, "serial_move": serial_move.uci(),
+                                    "parallel_move": parallel_move.uci(),
+                                    "serial_time": serial_time, "parallel_time": parallel_time})
+    parallel.close()
+
+    report["serial_time"] = serial_total
+    report["parallel_time"] = parallel_total
+    report["speedup"] = serial_total / parallel_total if parallel_total else 0.0
+    report["identical"] = all(p["serial_move"] == p["parallel_move"] for p in report["positions"])
+    return report
+
+
+if __name__ == '__main__':
+    result = benchmark_parallel()
+    for position in result["positions"]:
+        print(position["fen"], position["serial_move"], position["parallel_move"],
+              "%.2fs / %.2fs" % (position["serial_time"], position["parallel_time"]))
+    print("Speedup with %d workers: %.2fx (same moves: %s)" %
+          (result["workers"], result["speedup"], result["identical"]))
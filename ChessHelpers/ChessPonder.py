@@ -0,0 +1,177 @@
+# Chess Pondering
+#
+# This file contains a move generator which keeps thinking on the opponent's time ("pondering").
+# After mini_max_move has found our move, it guesses the opponent's reply (the second move of the
+# principal variation) and searches the position after that reply in a background process, while
+# the opponent (a player in the UI, or another engine) is thinking. On our next move:
+#
+#   - ponder hit (the opponent played the expected reply): if the background search is done, its move
+#     is played at once, otherwise it keeps searching (it already has a head start) until it is done,
+#     or until TIME_LIMIT has passed since it started
+#   - ponder miss: the background search is stopped and thrown away, and we search normally
+#
+# The background search has its own MoveGenerator (and transposition table) in its own process,
+# so it doesn't slow down an opponent running in this process.
+#
+# > move_generator = PonderingMoveGenerator()
+# > play_chess(board, black=move_generator.mini_max_move)
+# > print(move_generator.ponder_summary())
+# > move_generator.close()
+
+import math
+import time
+import inspect
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+import chess
+import chess.polyglot
+from ChessHelpers.ChessEngineHelper import MoveGenerator
+
+# state of the ponder process
+_ponder_generator = None
+_ponder_stop = None
+
+
+def _init_ponder(stop_event):
+    global _ponder_generator, _ponder_stop
+    _ponder_generator = MoveGenerator()
+    _ponder_stop = stop_event
+
+
+# search the position after the expected reply (runs in the ponder process) until it is done or stopped
+def _ponder_search(board, settings):
+    generator = _ponder_generator
+    for name, value in settings.items():
+        setattr(generator, name, value)
+    generator.stop_event = _ponder_stop
+    # (always iterative deepening: when the search is stopped early, the last completed depth is kept)
+    if generator.TIME_LIMIT is None:
+        generator.MAX_DEPTH = generator.DEPTH
+    generator.TIME_LIMIT = math.inf
+    move = generator.mini_max_move(board)
+    return move, generator.pv, generator.completed_depth, generator.nodes
+
+
+class PonderingMoveGenerator(MoveGenerator):
+    def __init__(self):
+        super().__init__()
+        self.PONDER = True
+        self.executor = None
+        self.ponder_stop = None
+        self.ponder_future = None
+        # the position we are pondering on (zobrist hash), and when we started
+        self.ponder_key = None
+        self.ponder_start = None
+        self.ponders = 0
+        self.hits = 0
+        self.misses = 0
+        # hits where the ponder search was already done when the opponent moved
+        self.instant_hits = 0
+
+    def start_workers(self):
+        if self.executor is None:
+            self.ponder_stop = multiprocessing.Event()
+            self.executor = ProcessPoolExecutor(max_workers=1, initializer=_init_ponder,
+                                                initargs=(self.ponder_stop,))
+
+    def close(self):
+        self.stop_pondering()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    def mini_max_move(self, board):
+        move = None
+        if self.ponder_future is not None:
+            move = self.ponder_result(board)
+        if move is None:
+            move = super().mini_max_move(board)
+        if move and self.PONDER and not self.cancelled():
+            self.start_pondering(board, move)
+        return move
+
+    # (stopped by stop_event, not just out of time)
+    def cancelled(self):
+        return self.stop_event is not None and self.stop_event.is_set()
+
+    # start searching the position after our move and the expected reply
+    def start_pondering(self, board, move):
+        if len(self.pv) < 2 or self.pv[0] != move:
+            return
+        position = board.copy()
+        position.push(move)
+        reply = self.pv[1]
+        if reply not in position.legal_moves:
+            return
+        position.push(reply)
+        if position.is_game_over():
+            return
+
+        self.start_workers()
+        self.ponder_stop.clear()
+        self.ponder_key = chess.polyglot.zobrist_hash(position)
+        self.ponder_start = time.perf_counter()
+        self.ponder_future = self.executor.submit(_ponder_search, position, self.settings())
+        self.ponders += 1
+
+    # stop the ponder search and throw it away (e.g. when the game is over)
+    def stop_pondering(self):
+        if self.ponder_future is not None:
+            self.ponder_stop.set()
+            wait([self.ponder_future])
+            self.ponder_future = None
+
+    '''
+    The move of the ponder search if the opponent played the expected reply (None on a ponder miss)
+    '''
+
+    def ponder_result(self, board):
+        if chess.polyglot.zobrist_hash(board) != self.ponder_key:
+            self.misses += 1
+            self.stop_pondering()
+            return None
+
+        self.hits += 1
+        future = self.ponder_future
+        self.ponder_future = None
+        if future.done():
+            self.instant_hits += 1
+        # keep searching (until the time for this move is up, counted from the start of the ponder search)
+        deadline = self.ponder_start + self.TIME_LIMIT if self.TIME_LIMIT is not None else math.inf
+        while not future.done():
+            wait([future], timeout=0.05)
+            if time.perf_counter() >= deadline or self.cancelled():
+                self.ponder_stop.set()
+        move, pv, depth, nodes = future.result()
+        self.pv = pv
+        self.completed_depth = depth
+        self.nodes = nodes
+        return move
+
+    def ponder_hit_rate(self):
+        guesses = self.hits + self.misses
+        return self.hits / guesses if guesses else 0.0
+
+    def ponder_stats(self):
+        return {
+            "ponders": self.ponders,
+            "hits": self.hits,
+            "misses": self.misses,
+            "instant_hits": self.instant_hits,
+            "hit_rate": self.ponder_hit_rate(),
+        }
+
+    def ponder_summary(self):
+        return "Pondering: %d hits, %d misses (hit rate %.0f%%), %d hits were instant" % (
+            self.hits, self.misses, self.ponder_hit_rate() * 100, self.instant_hits)
+
+
+# the PonderingMoveGenerators behind the move generator functions of a game (e.g. generator.mini_max_move,
+# or book.wrap(generator.mini_max_move))
+def pondering_generators(*players):
+    generators = []
+    for player in players:
+        generator = getattr(inspect.unwrap(player), "__self__", None) if callable(player) else None
+        if isinstance(generator, PonderingMoveGenerator) and generator not in generators:
+            generators.append(generator)
+    return generators
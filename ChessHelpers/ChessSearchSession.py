@@ -0,0 +1,68 @@
+# Chess Search Session
+#
+# This file contains the state the mini max search in ChessEngineHelper.py can keep between the
+# moves of a game (MoveGenerator.SESSION). Without it, every search starts cold: an empty
+# transposition table, no history or killer moves, and no principal variation, although most of
+# the tree under the line we predicted was searched one move earlier. With it, the next search
+# of the same game starts with:
+#
+#   - the transposition table of the last search, aged: its entries can still be used, but any
+#     entry of the new search can replace them (TranspositionTable.new_search). They give cutoffs
+#     wherever they were searched at least as deep as the new search needs: two moves later, the
+#     same position is searched two plies deeper, so that is mostly in the early iterations of
+#     iterative deepening. Everywhere else they still give the best move to search first
+#   - the killer moves and history scores of the last search, aged (MoveOrderer.age)
+#   - the rest of the last principal variation, if the game followed it
+#
+# A search is part of the same game when its board's move stack continues the move stack of the
+# last search. Anything else (another game, a position set up from scratch) starts cold, and
+# MoveGenerator.new_game() resets the session explicitly.
+
+
+class SearchSession:
+    def __init__(self):
+        self.start_fen = None
+        self.moves = None
+        self.searches = 0
+        self.warm_searches = 0
+
+    # forget the game (the next search starts cold)
+    def reset(self):
+        self.start_fen = None
+        self.moves = None
+
+    '''
+    How many moves were played since the last search, or None if the board isn't a later position
+    of the same game
+    '''
+
+    def plies_since(self, board):
+        if self.moves is None:
+            return None
+        stack = board.move_stack
+        if len(stack) < len(self.moves) or stack[:len(self.moves)] != self.moves:
+            return None
+        if board.root().fen() != self.start_fen:
+            return None
+        return len(stack) - len(self.moves)
+
+    # called at the start of every search: returns plies_since(board), None = start cold
+    def start_search(self, board):
+        plies = self.plies_since(board)
+        self.searches += 1
+        if plies is not None:
+            self.warm_searches += 1
+        self.start_fen = board.root().fen()
+        self.moves = list(board.move_stack)
+        return plies
+
+    # the rest of the last principal variation, if the moves played since were the ones it expected
+    def remaining_pv(self, pv, plies):
+        played = self.moves[len(self.moves) - plies:]
+        return pv[plies:] if pv[:plies] == played else []
+
+    def stats(self):
+        return {
+            "searches": self.searches,
+            "warm_searches": self.warm_searches,
+        }
@@ -0,0 +1,105 @@
+# Chess Search Statistics
+#
+# This file contains the statistics the mini max search in ChessEngineHelper.py can collect while it
+# is searching (MoveGenerator.STATS, or a progress callback):
+#
+#   - nodes visited at every ply, leaf evaluations and quiescence nodes
+#   - beta cutoffs, and at which move of the node they happened (0 = the first move searched)
+#   - for every iteration (depth): nodes, time, score, principal variation and branching factor
+#
+# When the statistics are disabled, MoveGenerator.stats is None and the search only pays for one
+# "is not None" check per node.
+
+import time
+
+
+class SearchStats:
+    def __init__(self, callback=None):
+        # callback(stats, iteration) is called after every iteration of the search
+        self.callback = callback
+        self.start = time.perf_counter()
+        self.nodes_per_ply = []
+        self.leaf_evaluations = 0
+        self.quiescence_nodes = 0
+        self.cutoffs = 0
+        # cutoff_indices[i]: number of cutoffs caused by the i-th move searched at a node
+        self.cutoff_indices = []
+        self.iterations = []
+        self.iteration_start = self.start
+        self.iteration_nodes = 0
+
+    def node(self, ply, count=1):
+        while len(self.nodes_per_ply) <= ply:
+            self.nodes_per_ply.append(0)
+        self.nodes_per_ply[ply] += count
+
+    def cutoff(self, index):
+        self.cutoffs += 1
+        while len(self.cutoff_indices) <= index:
+            self.cutoff_indices.append(0)
+        self.cutoff_indices[index] += 1
+
+    '''
+    Called by the search when an iteration is done (nodes and quiescence_nodes are the search's totals)
+    '''
+
+    def end_iteration(self, depth, score, pv, nodes, quiescence_nodes, complete=True):
+        now = time.perf_counter()
+        iteration = {
+            "depth": depth,
+            "score": score,
+            "pv": [move.uci() for move in pv],
+            "nodes": nodes - self.iteration_nodes,
+            "time": now - self.iteration_start,
+            "total_time": now - self.start,
+            "complete": complete,
+        }
+        previous = [i for i in self.iterations if i["complete"]]
+        # (how many times more nodes this depth needed than the one before)
+        if previous and previous[-1]["nodes"] and complete:
+            iteration["branching_factor"] = iteration["nodes"] / previous[-1]["nodes"]
+        else:
+            iteration["branching_factor"] = None
+        iteration["nodes_per_second"] = iteration["nodes"] / iteration["time"] if iteration["time"] else 0.0
+        self.iterations.append(iteration)
+        self.iteration_start = now
+        self.iteration_nodes = nodes
+        self.quiescence_nodes = quiescence_nodes
+        if self.callback is not None:
+            self.callback(self, iteration)
+        return iteration
+
+    # the principal variation of the last complete iteration
+    def pv(self):
+        for iteration in reversed(self.iterations):
+            if iteration["complete"]:
+                return iteration["pv"]
+        return []
+
+    '''
+    Average number of moves searched per node: nodes at ply + 1 / nodes at ply, over the whole tree
+    (the effective branching factor of an iteration is in iterations[i]["branching_factor"])
+    '''
+
+    def branching_factor(self):
+        parents = sum(self.nodes_per_ply[:-1])
+        children = sum(self.nodes_per_ply[1:])
+        return children / parents if parents else 0.0
+
+    def first_move_cutoff_rate(self):
+        return self.cutoff_indices[0] / self.cutoffs if self.cutoffs else 0.0
+
+    def as_dict(self):
+        return {
+            "nodes": sum(self.nodes_per_ply),
+            "nodes_per_ply": self.nodes_per_ply,
+            "leaf_evaluations": self.leaf_evaluations,
+            "quiescence_nodes": self.quiescence_nodes,
+            "cutoffs": self.cutoffs,
+            "cutoff_indices": self.cutoff_indices,
+            "first_move_cutoff_rate": self.first_move_cutoff_rate(),
+            "branching_factor": self.branching_factor(),
+            "iterations": self.iterations,
+            "pv": self.pv(),
+            "time": time.perf_counter() - self.start,
+        }
@@ -0,0 +1,240 @@
+# Chess Tournament
+#
+# This file contains a headless match runner which plays many games between two move generation
+# methods of MoveGenerator (e.g. "mini_max_move" against "greedy_best_next_move").
+# Unlike example_tui.py, nothing is printed while the games are played, and the games are spread
+# across a pool of worker processes. Every finished game is written as one line of JSON, and the
+# match is summed up as wins/draws/losses and an Elo difference with error bars.
+#
+# > python -m ChessHelpers.ChessTournament mini_max_move greedy_best_next_move --games 1000 --depth-a 2
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import chess
+from ChessHelpers.ChessEngineHelper import MoveGenerator
+
+# games which are still going after this many plies are adjudicated as draws
+MAX_PLIES = 400
+
+# state of a worker process
+_worker_generators = None
+
+
+def _init_worker(settings_a, settings_b):
+    global _worker_generators
+    _worker_generators = []
+    for settings in (settings_a, settings_b):
+        generator = MoveGenerator()
+        for name, value in (settings or {}).items():
+            setattr(generator, name, value)
+        _worker_generators.append(generator)
+
+
+# the starting position of a pair of games: a fixed opening, or some random moves from it
+def opening_position(openings, random_plies, seed):
+    rng = random.Random(seed)
+    board = chess.Board(rng.choice(openings)) if openings else chess.Board()
+    for _ in range(random_plies):
+        legal_moves = list(board.legal_moves)
+        if not legal_moves or board.is_game_over():
+            break
+        board.push(rng.choice(legal_moves))
+    # (if the random moves ended the game, start from the opening itself)
+    if board.is_game_over():
+        board = chess.Board(rng.choice(openings)) if openings else chess.Board()
+    return board.fen()
+
+
+# play one game (runs in a worker process)
+def _play_game(game, player_a, player_b, fen, a_is_white, seed, max_plies):
+    random.seed(seed)  # (for random_move, so every game can be replayed)
+    generator_a, generator_b = _worker_generators
+    players = {chess.WHITE: getattr(generator_a, player_a), chess.BLACK: getattr(generator_b, player_b)}
+    if not a_is_white:
+        players = {chess.WHITE: getattr(generator_b, player_b), chess.BLACK: getattr(generator_a, player_a)}
+
+    board = chess.Board(fen)
+    times = {chess.WHITE: 0.0, chess.BLACK: 0.0}
+    moves = {chess.WHITE: 0, chess.BLACK: 0}
+    start = time.perf_counter()
+    outcome = board.outcome()
+    while outcome is None and board.ply() < max_plies:
+        turn = board.turn
+        move_start = time.perf_counter()
+        move = players[turn](board)
+        times[turn] += time.perf_counter() - move_start
+        moves[turn] += 1
+        board.push(move)
+        outcome = board.outcome()
+
+    if outcome is None:
+        result, termination = "1/2-1/2", "MAX_PLIES"
+    else:
+        result, termination = outcome.result(), outcome.termination.name
+    a_color = chess.WHITE if a_is_white else chess.BLACK
+    if result == "1/2-1/2":
+        score_a = 0.5
+    else:
+        score_a = 1.0 if (result == "1-0") == (a_color == chess.WHITE) else 0.0
+
+    return {
+        "game": game,
+        "white": "A" if a_is_white else "B",
+        "fen": fen,
+        "result": result,
+        "termination": termination,
+        "score_a": score_a,
+        "plies": len(board.move_stack),
+        "moves": " ".join(move.uci() for move in board.move_stack),
+        "time": time.perf_counter() - start,
+        "time_a": times[a_color], "moves_a": moves[a_color],
+        "time_b": times[not a_color], "moves_b": moves[not a_color],
+    }
+
+
+'''
+Elo difference of player A (and the 95% error margin) from the game scores
+
+The expected score of a player who is d Elo stronger is 1 / (1 + 10^(-d/400)), so the Elo difference
+follows from the average score. The error margin converts score +/- 1.96 standard errors to Elo.
+(+/- infinity if one player won or lost every game, and then the error margin is None: the games
+say nothing about how much stronger the winner is)
+'''
+
+
+def elo_difference(wins, draws, losses):
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0, 0.0
+    if wins == games:
+        return math.inf, None
+    if losses == games:
+        return -math.inf, None
+
+    def elo(score):
+        if score <= 0.0:
+            return -math.inf
+        if score >= 1.0:
+            return math.inf
+        return 400 * math.log10(score / (1 - score))
+
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = 1.96 * math.sqrt(variance / games)
+    low, high = elo(score - margin), elo(score + margin)
+    return elo(score), (high - low) / 2
+
+
+# a result as a line of JSON (infinite and NaN floats, which JSON doesn't have, are written as null)
+def to_json(result):
+    return json.dumps({name: None if isinstance(value, float) and not math.isfinite(value) else value
+                       for name, value in result.items()})
+
+
+def summarize(results, elapsed):
+    wins = sum(1 for r in results if r["score_a"] == 1.0)
+    draws = sum(1 for r in results if r["score_a"] == 0.5)
+    losses = len(results) - wins - draws
+    elo, elo_error = elo_difference(wins, draws, losses)
+    moves_a = sum(r["moves_a"] for r in results)
+    moves_b = sum(r["moves_b"] for r in results)
+    return {
+        "games": len(results),
+        "wins": wins, "draws": draws, "losses": losses,
+        "elo": elo, "elo_error": elo_error,
+        "time": elapsed,
+        "games_per_second": len(results) / elapsed if elapsed else 0.0,
+        "latency_a": sum(r["time_a"] for r in results) / moves_a if moves_a else 0.0,
+        "latency_b": sum(r["time_b"] for r in results) / moves_b if moves_b else 0.0,
+    }
+
+
+'''
+Tournament
+
+Plays 'games' games of player_a against player_b (names of MoveGenerator methods, each with its
+own settings, e.g. {"DEPTH": 2}). The games are played in pairs from the same starting position,
+A playing white in the first game and black in the second. The starting positions are taken from
+'openings' (FENs, default: the initial position) followed by 'random_plies' random moves.
+
+Every game is appended to 'output' (JSONL) as soon as it is finished, and the summary is returned
+(wins/draws/losses from player A's point of view).
+'''
+
+
+def play_tournament(player_a, player_b, games=100, workers=None, settings_a=None, settings_b=None,
+                    openings=None, random_plies=0, output=None, seed=0, max_plies=MAX_PLIES):
+    for player in (player_a, player_b):
+        if not callable(getattr(MoveGenerator, player, None)):
+            raise ValueError("Unknown move generator: " + str(player))
+    workers = workers if workers is not None else os.cpu_count()
+
+    results = []
+    file = open(output, "w") if output is not None else None
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(settings_a, settings_b)) as executor:
+            futures = []
+            for game in range(games):
+                pair = game // 2
+                fen = opening_position(openings, random_plies, seed * 1000003 + pair)
+                futures.append(executor.submit(_play_game, game, player_a, player_b, fen, game % 2 == 0,
+                                               seed * 1000003 + game, max_plies))
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if file is not None:
+                    file.write(to_json(result) + "\n")
+                    file.flush()
+    finally:
+        if file is not None:
+            file.close()
+
+    summary = summarize(results, time.perf_counter() - start)
+    summary.update({"player_a": player_a, "player_b": player_b,
+                    "settings_a": settings_a or {}, "settings_b": settings_b or {}})
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play a headless match between two move generators.")
+    parser.add_argument("player_a")
+    parser.add_argument("player_b")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--depth-a", type=int, default=None)
+    parser.add_argument("--depth-b", type=int, default=None)
+    parser.add_argument("--openings", help="file with one FEN per line")
+    parser.add_argument("--random-plies", type=int, default=0)
+    parser.add_argument("--output", help="JSONL file for the game results")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    openings = None
+    if args.openings:
+        with open(args.openings) as file:
+            openings = [line.strip() for line in file if line.strip()]
+    settings_a = {"DEPTH": args.depth_a} if args.depth_a is not None else None
+    settings_b = {"DEPTH": args.depth_b} if args.depth_b is not None else None
+
+    summary = play_tournament(args.player_a, args.player_b, args.games, args.workers, settings_a, settings_b,
+                              openings, args.random_plies, args.output, args.seed)
+    print("%s vs %s: +%d =%d -%d" % (args.player_a, args.player_b,
+                                     summary["wins"], summary["draws"], summary["losses"]))
+    if summary["elo_error"] is None:
+        print("Elo difference: %s (one player won every game)" % ("+inf" if summary["elo"] > 0 else "-inf"))
+    else:
+        print("Elo difference: %.1f +/- %.1f" % (summary["elo"], summary["elo_error"]))
+    print("%.2f games/s, average move time: %.2fms (A) / %.2fms (B)" %
+          (summary["games_per_second"], summary["latency_a"] * 1000, summary["latency_b"] * 1000))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
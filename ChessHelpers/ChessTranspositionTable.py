@@ -0,0 +1,136 @@
+# Chess Transposition Table
+#
+# This file contains a bounded transposition table which is used by the mini max search
+# in ChessEngineHelper.py. Positions are keyed by a 64-bit hash of their bitboards, so when a
+# position is reached again through a different move order, the search can reuse the
+# score and best move it already found for it instead of searching it from scratch.
+
+import chess
+
+# bound types
+#   EXACT: the score is the true value of the position (searched inside the window)
+#   LOWER: the search failed high, the true value is at least the score (beta cutoff)
+#   UPPER: the search failed low, the true value is at most the score
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# the scores in the table are from the point of view of the player who started the search
+# (see heuristic_2), so the same position searched for white and for black needs two keys
+PERSPECTIVE_KEY = 0xC3A5C85C97CB3127
+KEY_MASK = 0xFFFFFFFFFFFFFFFF
+
+# replacement policies
+#   "depth": keep the entry which was searched deeper (a different position can only
+#            replace an entry if it was searched to at least the same depth, or if the entry
+#            is stale: left over from an earlier search, see new_search)
+#   "always": always overwrite the slot with the newest entry
+REPLACEMENT_POLICIES = ("depth", "always")
+
+
+class TTEntry:
+    __slots__ = ("key", "depth", "score", "bound", "move", "generation")
+
+    def __init__(self, key, depth, score, bound, move, generation=0):
+        self.key = key
+        self.depth = depth
+        self.score = score
+        self.bound = bound
+        self.move = move
+        self.generation = generation  # the search which stored it
+
+
+class TranspositionTable:
+    def __init__(self, size=2**18, replacement="depth"):
+        if replacement not in REPLACEMENT_POLICIES:
+            raise ValueError("Unknown replacement policy: " + str(replacement))
+        self.size = size  # maximum number of entries (one entry per slot)
+        self.replacement = replacement
+        self.table = [None] * size
+        # incremented by new_search when the table is kept for the next search (see ChessSearchSession.py)
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0  # probes which found a different position in the slot
+        self.stores = 0
+
+    '''
+    Returns the 64-bit key for a board, as seen by the player who started the search.
+    The key is Python's hash of the board's bitboards, side to move, castling rights and en passant
+    square: chess.polyglot.zobrist_hash would look at every piece again at every node (35µs, which
+    is more than scoring a leaf), this takes under 1µs. Like the tuple's ints, it is the same in
+    every process (the Lazy SMP helpers share the keys), so the en passant square is -1 instead of None.
+    '''
+
+    def key(self, board, white):
+        key = hash((board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings,
+                    board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK], board.turn,
+                    board.castling_rights, board.ep_square if board.ep_square is not None else -1)) & KEY_MASK
+        if not white:
+            key ^= PERSPECTIVE_KEY
+        return key
+
+    '''
+    Returns the entry stored for the key, or None if this position is not in the table
+    '''
+
+    def probe(self, key):
+        entry = self.table[key % self.size]
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.key != key:
+            self.misses += 1
+            self.collisions += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def store(self, key, depth, score, bound, move):
+        index = key % self.size
+        entry = self.table[index]
+        if entry is not None and self.replacement == "depth":
+            # same position: keep whichever search went deeper
+            # (but still remember the newer best move if the old entry had none)
+            if entry.key == key and entry.depth > depth:
+                if entry.move is None:
+                    entry.move = move
+                return
+            # different position: only replace it with an equal or deeper search (or if it is stale)
+            if entry.key != key and entry.depth > depth and entry.generation == self.generation:
+                return
+        self.table[index] = TTEntry(key, depth, score, bound, move, self.generation)
+        self.stores += 1
+
+    '''
+    Keeps the entries for the next search, but ages them: they can still be used,
+    but any entry of the new search can replace them
+    '''
+
+    def new_search(self):
+        self.generation += 1
+        self.reset_stats()
+
+    def clear(self):
+        self.table = [None] * self.size
+        self.generation = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    def stats(self):
+        probes = self.hits + self.misses
+        return {
+            "size": self.size,
+            "replacement": self.replacement,
+            "hits": self.hits,
+            "misses": self.misses,
+            "collisions": self.collisions,
+            "stores": self.stores,
+            "generation": self.generation,
+            "hit_rate": self.hits / probes if probes else 0.0,
+        }
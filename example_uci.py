@@ -0,0 +1,20 @@
+# Chess Program (UCI engine)
+#
+# Basic requirements:
+# > pip install python-chess
+#
+# Starts our engine as a UCI engine: instead of running this file yourself, add
+# "python example_uci.py" as an engine in any chess GUI or match manager which speaks UCI
+# (it has to be started from this directory).
+#
+
+from ChessHelpers import ChessEngineHelper
+from interface.uci import main
+
+if __name__ == '__main__':
+    # any settings of the move generator can be changed here
+    move_generator = ChessEngineHelper.MoveGenerator()
+    move_generator.PVS = True
+    # keep the transposition table and move ordering between the moves of a game
+    move_generator.SESSION = True
+    main(move_generator=move_generator)
@@ -15,8 +15,13 @@
 
 import sys
 import os
+import time
+import inspect
+import threading
+from collections import deque
 import pygame
 import chess
+from ChessHelpers.ChessPonder import pondering_generators
 
 
 # constants and configuration
@@ -32,6 +37,69 @@ COLOR_DRAW_SELECT = (220, 10, 0, 50)
 COLOR_DRAW_DRAG = (0, 220, 0, 50)
 ENABLE_ILLEGAL_MOVES = False  # allow white to make custom moves (for testing)
 IMAGE_PATH = "interface/images/"
+PIECE_SIZE = TILE_SIZE - 4  # the piece images are scaled to this size once, when they are loaded
+FPS = 60
+# event-driven loop: instead of drawing FPS frames per second, sleep until something happens
+# (input, an engine move, or the next "Thinking..." animation step) and only draw then
+EVENT_DRIVEN = True
+THINKING_DOT_MS = 300
+# posted by an EngineWorker when its move is ready, to wake up the event-driven loop
+ENGINE_DONE = pygame.USEREVENT + 1
+FRAME_TIMES_KEPT = 10000  # (the percentiles of FrameTimes are computed over the last frames only)
+
+
+# computes the moves of a move generator on a background thread, so the UI keeps running while it thinks
+# (the game loop polls result() every frame instead of waiting for the move)
+class EngineWorker:
+    def __init__(self, move_generator_function):
+        self.function = move_generator_function
+        # cancellation token: if the function is a method of a MoveGenerator (or wraps one, like
+        # OpeningBook.wrap does), its search stops when this is set
+        self.cancelled = threading.Event()
+        generator = getattr(inspect.unwrap(move_generator_function), "__self__", None)
+        if generator is not None and hasattr(generator, "stop_event"):
+            generator.stop_event = self.cancelled
+        self.thread = None
+        self.move = None
+        self.error = None
+
+    def start(self, chess_board):
+        self.move = None
+        self.error = None
+        # (the search works on a copy, the UI keeps drawing the real board in the meantime)
+        self.thread = threading.Thread(target=self.run, args=(chess_board.copy(),), daemon=True)
+        self.thread.start()
+
+    def run(self, chess_board):
+        try:
+            self.move = self.function(chess_board)
+        except Exception as e:
+            self.error = e
+        if not self.cancelled.is_set():
+            try:
+                pygame.event.post(pygame.event.Event(ENGINE_DONE))
+            except pygame.error:
+                # (the window was closed in the meantime)
+                pass
+
+    def thinking(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    # returns the move once it has been found (None while still thinking)
+    def result(self):
+        if self.thread is None or self.thread.is_alive():
+            return None
+        self.thread = None
+        if self.error is not None:
+            raise self.error
+        return self.move
+
+    def cancel(self):
+        self.cancelled.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.cancelled.clear()
 
 
 # create the board surface by drawing the tiles
@@ -105,6 +173,50 @@ def get_piece(f):
         return 'black', 'pawn'
 
 
+# the piece images, loaded (and scaled) only once instead of every frame,
+# plus a faded copy of every piece for when it is selected
+class SpriteCache:
+    def __init__(self):
+        self.sprites = {}
+
+    def get(self, color, piece_type, selected=False):
+        key = color, piece_type, selected
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            if selected:
+                sprite = self.get(color, piece_type).copy()
+                sprite.fill((255, 255, 255, 90), None, pygame.BLEND_RGBA_MULT)
+            else:
+                sprite = pygame.image.load(resource_path(IMAGE_PATH + color + "/" + piece_type + ".png")).convert_alpha()
+                if sprite.get_size() != (PIECE_SIZE, PIECE_SIZE):
+                    sprite = pygame.transform.smoothscale(sprite, (PIECE_SIZE, PIECE_SIZE))
+            self.sprites[key] = sprite
+        return sprite
+
+    # load everything up front (needs the display to be set up already)
+    def preload(self):
+        for color in ('white', 'black'):
+            for piece_type in ('king', 'queen', 'rook', 'bishop', 'knight', 'pawn'):
+                self.get(color, piece_type)
+                self.get(color, piece_type, True)
+
+
+SPRITES = SpriteCache()
+
+
+def square_rect(x, y):
+    return pygame.Rect(BOARD_POS[0] + x*TILE_SIZE, BOARD_POS[1] + y*TILE_SIZE, TILE_SIZE, TILE_SIZE)
+
+
+def draw_piece(screen, piece, x, y, selected=False):
+    color, piece_type = piece
+    sprite = SPRITES.get(color, piece_type, selected)
+    pos = square_rect(x, y).move(1, 1)
+    # (drawn twice, the second time 1 pixel to the side as a shadow)
+    screen.blit(sprite, sprite.get_rect(center=pos.center).move(1, 1))
+    screen.blit(sprite, sprite.get_rect(center=pos.center))
+
+
 def draw_pieces(screen, board, font, selected_piece):
     sx, sy = None, None
     if selected_piece:
@@ -114,16 +226,7 @@ def draw_pieces(screen, board, font, selected_piece):
         for x in range(8):
             piece = board[y][x]
             if piece:
-                selected = x == sx and y == sy
-                color, piece_type = piece
-                s1 = pygame.image.load(resource_path(IMAGE_PATH + color + "/" + piece_type + ".png")).convert_alpha()
-                s2 = pygame.image.load(resource_path(IMAGE_PATH + color + "/" + piece_type + ".png")).convert_alpha()
-                if selected:
-                    s2.fill((255, 255, 255, 90), None, pygame.BLEND_RGBA_MULT)
-                    s1.fill((255, 255, 255, 90), None, pygame.BLEND_RGBA_MULT)
-                pos = pygame.Rect(BOARD_POS[0] + x*TILE_SIZE + 1, BOARD_POS[1] + y*TILE_SIZE + 1, TILE_SIZE, TILE_SIZE)
-                screen.blit(s2, s2.get_rect(center=pos.center).move(1, 1))
-                screen.blit(s1, s1.get_rect(center=pos.center))
+                draw_piece(screen, piece, x, y, x == sx and y == sy)
 
 
 def resource_path(relative_path):
@@ -151,19 +254,29 @@ def draw_drag(screen, board, selected_piece, font):
             pygame.draw.rect(screen, COLOR_DRAW_DRAG, rect, 3)
 
         color, piece_type = selected_piece[0]
-        s1 = pygame.image.load(resource_path(IMAGE_PATH + color + "/" + piece_type + ".png")).convert_alpha()
-        s2 = pygame.image.load(resource_path(IMAGE_PATH + color + "/" + piece_type + ".png")).convert_alpha()
+        sprite = SPRITES.get(color, piece_type)
 
         pos = pygame.Vector2(pygame.mouse.get_pos())
-        screen.blit(s2, s2.get_rect(center=pos + pygame.Vector2((1, 1))))
-        screen.blit(s1, s1.get_rect(center=pos))
+        screen.blit(sprite, sprite.get_rect(center=pos + pygame.Vector2((1, 1))))
+        screen.blit(sprite, sprite.get_rect(center=pos))
         selected_rect = pygame.Rect(BOARD_POS[0] + selected_piece[1] * TILE_SIZE, BOARD_POS[1] +
                                     selected_piece[2] * TILE_SIZE, TILE_SIZE, TILE_SIZE)
         pygame.draw.line(screen, pygame.Color(COLOR_DRAW_LINE), selected_rect.center, pos, 2)
         return x, y
 
 
-def draw_info(screen, chess_board, font):
+# (the dots show that the UI is still running)
+def thinking_text():
+    return "Thinking" + "." * (pygame.time.get_ticks() // THINKING_DOT_MS % 4)
+
+
+'''
+The texts of the info panel, rendered as (surface, position) pairs
+(they only change when a move is made, so they can be rendered once per ply)
+'''
+
+
+def render_info(chess_board, font, outcome):
     last_move_w = "White: "
     last_move_b = "Black: "
     ply = chess_board.ply()
@@ -181,7 +294,6 @@ def draw_info(screen, chess_board, font):
             last_move_b += chess_board.peek().uci()
 
     black_win = white_win = checkmate = ""
-    outcome = chess_board.outcome()
     if outcome is not None:
         if outcome.winner is None:
             checkmate = "Draw"
@@ -203,17 +315,169 @@ def draw_info(screen, chess_board, font):
     pos3 = pygame.Rect(BORDER, BORDER*3 + TILE_SIZE*8 + 25, TILE_SIZE*8, INFO_HEIGHT)
     pos4 = pygame.Rect(BORDER, BORDER*3 + TILE_SIZE*8 + 25, TILE_SIZE*8, INFO_HEIGHT)
     pos5 = pygame.Rect(BORDER, BORDER*3 + TILE_SIZE*8 + 25, TILE_SIZE*8, INFO_HEIGHT)
-    screen.blit(s1, s1.get_rect(topleft=pos1.topleft))
-    screen.blit(s2, s2.get_rect(topright=pos2.topright))
-    screen.blit(s3, s2.get_rect(topleft=pos3.topleft))
-    screen.blit(s4, s2.get_rect(topright=pos4.topright))
-    screen.blit(s5, s2.get_rect(midtop=pos5.midtop))
+    return [(s1, s1.get_rect(topleft=pos1.topleft)),
+            (s2, s2.get_rect(topright=pos2.topright)),
+            (s3, s2.get_rect(topleft=pos3.topleft)),
+            (s4, s2.get_rect(topright=pos4.topright)),
+            (s5, s2.get_rect(midtop=pos5.midtop))]
+
+
+# (pass the texts from render_info to draw them again without rendering them again)
+def draw_info(screen, chess_board, font, thinking=False, texts=None):
+    if texts is None:
+        texts = render_info(chess_board, font, chess_board.outcome())
+    for surface, rect in texts:
+        screen.blit(surface, rect)
+
+    if thinking:
+        s6 = font.render(thinking_text(), True, pygame.Color(COLOR_LIGHT))
+        pos6 = pygame.Rect(BORDER, BORDER*3 + TILE_SIZE*8 + 50, TILE_SIZE*8, INFO_HEIGHT)
+        screen.blit(s6, s6.get_rect(midtop=pos6.midtop))
+
+
+# draws a frame by only redrawing what changed since the last one (dirty rects):
+#   - the board and its pieces are kept on a background surface, where only the squares
+#     whose piece changed are redrawn
+#   - the info panel is only redrawn when its text changes
+#   - the dragged piece, its line and the square selectors are drawn on top of the background every frame,
+#     and erased on the next one by copying back the background under them
+# and then only the parts of the window which changed are updated on the screen
+class BoardRenderer:
+    def __init__(self, screen, board_surface, font):
+        self.screen = screen
+        self.board_surface = board_surface
+        self.font = font
+        self.background = pygame.Surface(screen.get_size())
+        w, h = screen.get_size()
+        self.info_rect = pygame.Rect(0, BORDER + TILE_SIZE*8, w, h - BORDER - TILE_SIZE*8)
+        # the rendered info texts, and the ply they were rendered for
+        self.texts = None
+        self.texts_ply = None
+        self.invalidate()
+
+    # redraw everything on the next frame (e.g. when the window was covered)
+    def invalidate(self):
+        self.background.fill(pygame.Color(COLOR_BG))
+        self.background.blit(self.board_surface, BOARD_POS)
+        # what is drawn on each square of the background: (piece, selected)
+        self.squares = [[None] * 8 for y in range(8)]
+        self.info = None
+        self.overlay = None
+        self.full = True
+
+    # returns the area of the window which was updated
+    # (outcome is chess_board.outcome(), which the game loop already knows)
+    def draw(self, board, chess_board, selected_piece, drop_pos, piece, x, y, thinking=False, outcome=None):
+        dirty = []
+        sx, sy = (selected_piece[1], selected_piece[2]) if selected_piece else (None, None)
+        for row in range(8):
+            for col in range(8):
+                square = board[row][col], col == sx and row == sy
+                if square != self.squares[row][col]:
+                    self.squares[row][col] = square
+                    rect = square_rect(col, row)
+                    self.background.blit(self.board_surface, rect, rect.move(-BOARD_POS[0], -BOARD_POS[1]))
+                    if square[0]:
+                        draw_piece(self.background, square[0], col, row, square[1])
+                    dirty.append(rect)
+
+        info = chess_board.ply(), thinking_text() if thinking else None
+        if info != self.info:
+            self.info = info
+            if self.texts_ply != info[0]:
+                self.texts = render_info(chess_board, self.font, outcome)
+                self.texts_ply = info[0]
+            self.background.fill(pygame.Color(COLOR_BG), self.info_rect)
+            draw_info(self.background, chess_board, self.font, thinking, self.texts)
+            dirty.append(self.info_rect)
+
+        # erase the overlays of the last frame
+        if self.overlay is not None:
+            dirty.append(self.overlay)
+        if self.full:
+            self.screen.blit(self.background, (0, 0))
+        else:
+            for rect in dirty:
+                self.screen.blit(self.background, rect, rect)
+
+        # the overlays cover the selected square, the square under the mouse and the piece and line in between
+        self.overlay = None
+        if drop_pos:
+            draw_selector(self.screen, piece, x, y)
+        drop_pos = draw_drag(self.screen, board, selected_piece, self.font)
+        if selected_piece:
+            mouse = pygame.mouse.get_pos()
+            around_mouse = pygame.Rect(0, 0, TILE_SIZE*2, TILE_SIZE*2)
+            around_mouse.center = mouse
+            self.overlay = square_rect(sx, sy).union(around_mouse).inflate(4, 4).clip(self.screen.get_rect())
+            dirty.append(self.overlay)
+
+        if self.full:
+            self.full = False
+            pygame.display.flip()
+            return drop_pos, self.screen.get_width() * self.screen.get_height()
+        pygame.display.update(dirty)
+        return drop_pos, sum(rect.width * rect.height for rect in dirty)
+
+
+# time spent drawing every frame, and how much of the window was redrawn
+class FrameTimes:
+    def __init__(self):
+        self.frames = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.redrawn = 0.0
+        self.times = deque(maxlen=FRAME_TIMES_KEPT)
+
+    def record(self, seconds, redrawn=1.0):
+        self.frames += 1
+        self.total_time += seconds
+        self.max_time = max(self.max_time, seconds)
+        self.redrawn += redrawn
+        self.times.append(seconds)
+
+    def percentile(self, p):
+        if not self.times:
+            return 0.0
+        times = sorted(self.times)
+        return times[min(len(times) - 1, int(p / 100 * len(times)))]
+
+    def as_dict(self):
+        frames = max(self.frames, 1)
+        return {
+            "frames": self.frames,
+            "mean_ms": self.total_time / frames * 1000,
+            "p95_ms": self.percentile(95) * 1000,
+            "max_ms": self.max_time * 1000,
+            # (average fraction of the window redrawn per frame)
+            "redrawn": self.redrawn / frames,
+        }
+
+    def __str__(self):
+        stats = self.as_dict()
+        return "%d frames, %.2f ms/frame (p95 %.2f ms, max %.2f ms), %.1f%% of the window redrawn per frame" % (
+            stats["frames"], stats["mean_ms"], stats["p95_ms"], stats["max_ms"], stats["redrawn"] * 100)
+
+
+# chess_board.outcome() generates the legal moves, so it is only called once per ply
+def cached_outcome(chess_board, outcomes):
+    ply = chess_board.ply()
+    if ply not in outcomes:
+        outcomes[ply] = chess_board.outcome()
+    return outcomes[ply]
+
+
+# sleep until there is an event (with a timeout, to animate the "Thinking..." text while an engine searches)
+def wait_for_events(thinking):
+    event = pygame.event.wait(THINKING_DOT_MS) if thinking else pygame.event.wait()
+    return [event] + pygame.event.get()
 
 
 # game loop
 # white and black can each be passed a move generator function
 # otherwise they both accept player moves through the UI
-def play_chess(chess_board, white="player", black="player"):
+# (pass a FrameTimes as frame_times to measure how long drawing the frames takes)
+def play_chess(chess_board, white="player", black="player", frame_times=None):
     pygame.init()
     font = pygame.font.SysFont('', 32)
     pygame.display.set_caption("Chess UI")
@@ -223,18 +487,42 @@ def play_chess(chess_board, white="player", black="player"):
     # convert the real chess board object to custom board array
     board = create_board_from_fen(chess_board.board_fen())
     board_surface = create_board_surface()
+    SPRITES.preload()
+    renderer = BoardRenderer(screen, board_surface, font)
+    screen_area = w * h
     clock = pygame.time.Clock()
     selected_piece = None
     drop_pos = None
     piece = x = y = None
+    # the engines think on their own threads (the same function playing both sides gets one worker)
+    workers = {}
+    for player in (white, black):
+        if player != "player" and player not in workers:
+            workers[player] = EngineWorker(player)
+    outcomes = {}
+    # (a move was just made: don't wait for events before letting the next player move)
+    moved = True
     while True:
-        events = pygame.event.get()
+        thinking = any(worker.thinking() for worker in workers.values())
+        if EVENT_DRIVEN and not moved:
+            events = wait_for_events(thinking)
+        else:
+            events = pygame.event.get()
+        ply = chess_board.ply()
         for e in events:
             if e.type == pygame.QUIT:
-                return chess_board.outcome()
+                # stop a search which is still going before leaving
+                for worker in workers.values():
+                    worker.cancel()
+                for generator in pondering_generators(white, black):
+                    generator.close()
+                    print(generator.ponder_summary())
+                return cached_outcome(chess_board, outcomes)
+            if e.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                renderer.invalidate()
 
         # don't try to play if the game is over
-        outcome = chess_board.outcome()
+        outcome = cached_outcome(chess_board, outcomes)
         if outcome is None:
 
             if chess_board.turn == chess.WHITE and white == "player" \
@@ -276,27 +564,36 @@ def play_chess(chess_board, white="player", black="player"):
 
             else:
                 # generate and push a move to the real chess board
-                if chess_board.turn == chess.WHITE:
-                    move = white(chess_board)
-                    if move is False:
+                # (without waiting for it: the worker is started, and polled on the next frames)
+                worker = workers[white if chess_board.turn == chess.WHITE else black]
+                if not worker.thinking():
+                    move = worker.result()
+                    if move is None:
+                        worker.start(chess_board)
+                    elif move is False:
                         return
-                    chess_board.push(move)
-                else:
-                    move = black(chess_board)
-                    if move is False:
-                        return
-                    chess_board.push(move)
-                # update our array representation for the UI
-                board = create_board_from_fen(chess_board.board_fen())
+                    else:
+                        chess_board.push(move)
+                        # update our array representation for the UI
+                        board = create_board_from_fen(chess_board.board_fen())
                 # end of move generation
 
-        screen.fill(pygame.Color(COLOR_BG))
-        screen.blit(board_surface, BOARD_POS)
-        draw_pieces(screen, board, font, selected_piece)
-        if drop_pos:
-            draw_selector(screen, piece, x, y)
-        drop_pos = draw_drag(screen, board, selected_piece, font)
-        draw_info(screen, chess_board, font)
-
-        pygame.display.flip()
-        clock.tick(60)
+        elif moved:
+            # (the game just ended, an engine may still be thinking about a reply which will never come)
+            for generator in pondering_generators(white, black):
+                generator.stop_pondering()
+
+        moved = chess_board.ply() != ply
+        # (the event-driven loop doesn't draw for mouse movements, unless a piece is being dragged)
+        if EVENT_DRIVEN and not moved and not selected_piece and events \
+                and all(e.type == pygame.MOUSEMOTION for e in events):
+            continue
+
+        start = time.perf_counter()
+        thinking = any(worker.thinking() for worker in workers.values())
+        drop_pos, redrawn = renderer.draw(board, chess_board, selected_piece, drop_pos, piece, x, y, thinking,
+                                          cached_outcome(chess_board, outcomes))
+        if frame_times is not None:
+            frame_times.record(time.perf_counter() - start, redrawn / screen_area)
+
+        clock.tick(FPS)
@@ -9,6 +9,7 @@
 #
 
 import chess
+from ChessHelpers.ChessPonder import pondering_generators
 
 ENABLE_ILLEGAL_MOVES = False
 
@@ -57,6 +58,10 @@ def play_chess(board, white="player", black="player"):
         else:
             print("Game over!")
             print(outcome)
+            # (an engine may still be thinking about a reply which will never come)
+            for generator in pondering_generators(white, black):
+                generator.close()
+                print(generator.ponder_summary())
             print("\nFinal position:")
             print(board.unicode(invert_color=True))
             return outcome
@@ -0,0 +1,220 @@
+# Chess UCI
+#
+# This file contains a UCI (Universal Chess Interface) front end for our MoveGenerator, so the engine
+# can be used by any chess GUI, match manager or analysis tool which speaks UCI (Arena, Cute Chess,
+# BanksiaGUI...). The tool starts "python example_uci.py" and talks to it through stdin/stdout.
+#
+# Supported commands:
+#   uci, isready, ucinewgame, position [startpos | fen <fen>] [moves ...], stop, quit
+#   go [depth <n>] [movetime <ms>] [wtime <ms>] [btime <ms>] [winc <ms>] [binc <ms>] [movestogo <n>] [infinite]
+#   setoption name Depth value <n>, setoption name Hash value <MB>
+#
+# The search runs on a worker thread, so "stop" (and "isready") are answered while it is searching.
+# Protocol: https://www.shredderchess.com/chess-features/uci-universal-chess-interface.html
+
+import sys
+import math
+import threading
+import chess
+from ChessHelpers.ChessEngineHelper import MoveGenerator
+from ChessHelpers.ChessTranspositionTable import TranspositionTable
+
+ENGINE_NAME = "ChessAI"
+ENGINE_AUTHOR = "ChessAI contributors"
+
+DEFAULT_HASH_MB = 64
+MAX_HASH_MB = 4096
+# approximate memory used by one transposition table entry (the TTEntry object and its slot)
+TT_ENTRY_BYTES = 160
+
+# without a number of moves to go, assume the game lasts this many more moves
+DEFAULT_MOVES_TO_GO = 30
+# time left for the GUI to receive our move
+MOVE_OVERHEAD = 0.05
+
+
+class UCIEngine:
+    def __init__(self, move_generator=None, output=None):
+        self.move_generator = move_generator if move_generator is not None else MoveGenerator()
+        self.output = output if output is not None else sys.stdout
+        self.output_lock = threading.Lock()
+        self.board = chess.Board()
+        self.depth = self.move_generator.DEPTH
+        self.max_depth = self.move_generator.MAX_DEPTH
+        self.hash_mb = DEFAULT_HASH_MB
+        self.stop_event = threading.Event()
+        self.search_thread = None
+        self.move_generator.stop_event = self.stop_event
+        self.move_generator.on_iteration = self.send_info
+        self.set_hash(self.hash_mb)
+
+    def send(self, line):
+        with self.output_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    '''
+    Handles one line of input, returns False on "quit"
+    '''
+
+    def handle(self, line):
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+
+        if command == "uci":
+            self.send("id name " + ENGINE_NAME)
+            self.send("id author " + ENGINE_AUTHOR)
+            self.send("option name Depth type spin default %d min 1 max %d" % (self.depth, self.max_depth))
+            self.send("option name Hash type spin default %d min 1 max %d" % (DEFAULT_HASH_MB, MAX_HASH_MB))
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "ucinewgame":
+            self.stop()
+            self.board = chess.Board()
+            self.move_generator.new_game()
+        elif command == "position":
+            self.stop()
+            self.position(args)
+        elif command == "go":
+            self.stop()
+            self.go(args)
+        elif command == "stop":
+            self.stop()
+        elif command == "setoption":
+            self.stop()
+            self.set_option(args)
+        elif command == "quit":
+            self.stop()
+            return False
+        # (unknown commands are ignored, as the protocol asks)
+        return True
+
+    '''
+    Sets up the board. A bad FEN keeps the previous position, and the moves stop at the first
+    malformed or illegal one: either way the GUI is told with an "info string" and the engine carries on.
+    '''
+
+    def position(self, args):
+        if args and args[0] == "startpos":
+            board = chess.Board()
+            args = args[1:]
+        elif args and args[0] == "fen":
+            end = args.index("moves") if "moves" in args else len(args)
+            fen = " ".join(args[1:end])
+            try:
+                board = chess.Board(fen)
+            except ValueError:
+                self.send("info string invalid fen: " + fen)
+                return
+            args = args[end:]
+        else:
+            return
+        if args and args[0] == "moves":
+            for uci in args[1:]:
+                try:
+                    board.push_uci(uci)
+                except ValueError:
+                    self.send("info string illegal move: " + uci)
+                    break
+        self.board = board
+
+    def set_option(self, args):
+        if "name" not in args:
+            return
+        value_index = args.index("value") if "value" in args else len(args)
+        name = " ".join(args[args.index("name") + 1:value_index]).lower()
+        value = " ".join(args[value_index + 1:])
+        try:
+            if name == "depth":
+                self.depth = max(1, min(int(value), self.max_depth))
+            elif name == "hash":
+                self.set_hash(max(1, min(int(value), MAX_HASH_MB)))
+        except ValueError:
+            pass
+
+    def set_hash(self, mb):
+        self.hash_mb = mb
+        tt = self.move_generator.tt
+        self.move_generator.tt = TranspositionTable(mb * 2**20 // TT_ENTRY_BYTES, tt.replacement)
+
+    '''
+    Time for this move (seconds), from the go parameters: a fixed movetime, or a share of the clock
+    '''
+
+    def time_limit(self, params):
+        if "movetime" in params:
+            return max(0.01, params["movetime"] / 1000 - MOVE_OVERHEAD)
+        clock = params.get("wtime" if self.board.turn == chess.WHITE else "btime")
+        if clock is None:
+            return None
+        increment = params.get("winc" if self.board.turn == chess.WHITE else "binc", 0)
+        moves_to_go = params.get("movestogo") or DEFAULT_MOVES_TO_GO
+        limit = clock / moves_to_go + increment * 3 / 4
+        # (never use more than half of the clock on one move)
+        return max(0.01, min(limit, clock / 2) / 1000 - MOVE_OVERHEAD)
+
+    def go(self, args):
+        params = {}
+        infinite = "infinite" in args
+        for name in ("depth", "movetime", "wtime", "btime", "winc", "binc", "movestogo"):
+            if name in args:
+                try:
+                    params[name] = int(args[args.index(name) + 1])
+                except (IndexError, ValueError):
+                    pass
+
+        time_limit = None if infinite else self.time_limit(params)
+        generator = self.move_generator
+        # always search with iterative deepening, so there is an info line for every depth
+        # and a stopped search still has the move of the last completed depth
+        generator.TIME_LIMIT = time_limit if time_limit is not None else math.inf
+        generator.MAX_DEPTH = params.get("depth", self.max_depth if infinite else self.depth)
+
+        self.stop_event.clear()
+        self.search_thread = threading.Thread(target=self.search, args=(self.board.copy(), infinite), daemon=True)
+        self.search_thread.start()
+
+    # runs on the worker thread
+    def search(self, board, infinite=False):
+        move = None
+        if not board.is_game_over():
+            move = self.move_generator.mini_max_move(board)
+        if infinite:
+            # the search can end by itself (only one legal move, a checkmate found, MAX_DEPTH reached),
+            # but in infinite mode the move may only be sent after "stop"
+            self.stop_event.wait()
+        self.send("bestmove " + (move.uci() if move else "0000"))
+
+    def stop(self):
+        if self.search_thread is not None:
+            self.stop_event.set()
+            self.search_thread.join()
+            self.search_thread = None
+
+    # the on_iteration callback of the search: one info line per completed depth
+    def send_info(self, stats, iteration):
+        if not iteration["complete"]:
+            return
+        score = iteration["score"]
+        if abs(score) >= self.move_generator.CHECKMATE / 2:
+            # (our scores don't say how far away the checkmate is, the principal variation does)
+            moves = math.ceil(len(iteration["pv"]) / 2)
+            score_text = "mate %d" % (moves if score > 0 else -moves)
+        else:
+            score_text = "cp %d" % round(score * 100)
+        nodes = self.move_generator.nodes
+        elapsed = iteration["total_time"]
+        self.send("info depth %d score %s nodes %d nps %d time %d pv %s" %
+                  (iteration["depth"], score_text, nodes, nodes / elapsed if elapsed else 0,
+                   elapsed * 1000, " ".join(iteration["pv"])))
+
+
+def main(input_stream=None, move_generator=None):
+    engine = UCIEngine(move_generator)
+    for line in (input_stream if input_stream is not None else sys.stdin):
+        if not engine.handle(line):
+            break
+    engine.stop()